@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
@@ -8,7 +9,11 @@ from app.infrastructure.routes.user import user_route
 from app.infrastructure.routes.transaction import transactions_router
 from app.infrastructure.routes.ml_routes import ml_router
 from database.database import init_db, get_database_engine, disconnect_db
+from broker.transport import open_transport, close_transport
+from app.infrastructure.auth.hash_password import password_hasher
+from app.infrastructure.services.task_status import start_task_status_updates, stop_task_status_updates
 from config.app_config import get_settings
+from metrics.asgi import MetricsMiddleware
 
 
 logger = logging.getLogger(__name__)
@@ -27,7 +32,9 @@ def create_application() -> FastAPI:
         # description=settings.APP_DESCRIPTION,
         # version=settings.API_VERSION,
         docs_url="/api/docs",
-        redoc_url="/api/redoc"
+        redoc_url="/api/redoc",
+        # Ответы сериализуются orjson, а не стандартным json
+        default_response_class=ORJSONResponse,
     )
 
     # Configure CORS
@@ -39,6 +46,9 @@ def create_application() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Per-route latency histograms for /metrics
+    app.add_middleware(MetricsMiddleware)
+
     # Register routes
     app.include_router(home_route, tags=['Home'])
     app.include_router(user_route, prefix='/api/users', tags=['Users'])
@@ -56,6 +66,10 @@ async def on_startup():
         await get_database_engine()  # Подключение и создие engine/sessionmaker
         logger.info("Creating database tables...")
         await init_db(drop_all=False)
+        logger.info("Opening message transport...")
+        await open_transport()
+        logger.info("Subscribing task status cache to completion events...")
+        await start_task_status_updates()
         logger.info("Application startup completed successfully")
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
@@ -64,7 +78,10 @@ async def on_startup():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown."""
-    logger.info("Application shutting down, disposing database engine...")
+    logger.info("Application shutting down, closing transport and disposing database engine...")
+    await stop_task_status_updates()
+    password_hasher.shutdown()
+    await close_transport()
     await disconnect_db() # Отключение
 
 if __name__ == '__main__':
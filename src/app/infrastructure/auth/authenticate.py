@@ -3,8 +3,9 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.infrastructure.auth.cache import token_cache, user_cache
 from app.infrastructure.auth.jwt_handler import verify_token
-from app.infrastructure.auth.hash_password import verify_password
+from app.infrastructure.auth.hash_password import password_hasher
 from app.infrastructure.models.user import User
 from database.database import get_session
 
@@ -13,7 +14,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 async def authenticate_user(email: str, password: str, session: AsyncSession) -> User | None:
     result = await session.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
-    if not user or not verify_password(password, user.password):
+    if not user or not await password_hasher.verify(password, user.password):
         return None
     return user
 
@@ -26,15 +27,24 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    payload = verify_token(token)
+    payload = token_cache.get(token)
     if payload is None:
-        raise credentials_exception
+        payload = verify_token(token)
+        if payload is None:
+            raise credentials_exception
+        token_cache.put(token, payload)
     email: str = payload.get("sub")
     if email is None:
         raise credentials_exception
 
+    cached = user_cache.get(email)
+    if cached is not None:
+        # Привязываем копию к сессии запроса без обращения к БД
+        return await session.merge(cached, load=False)
+
     result = await session.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    user_cache.put(user)
+    return user
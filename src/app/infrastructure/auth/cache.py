@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.infrastructure.models.user import User
+from config.app_config import Settings
+
+
+class _LRUTTLCache:
+    """LRU со сроком жизни каждой записи и счетчиками попаданий."""
+
+    def __init__(self, max_items: int):
+        self._max_items = max_items
+        self._items: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        item = self._items.get(key)
+        if item is None or item[0] <= time.time():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def _put(self, key, value, expires_at: float) -> None:
+        self._items[key] = (expires_at, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_items:
+            self._items.popitem(last=False)
+
+    def _pop(self, key):
+        item = self._items.pop(key, None)
+        return item[1] if item is not None else None
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio}
+
+
+class TokenCache(_LRUTTLCache):
+    """
+    Проверенные токены -> claims. Запись живет не дольше exp самого токена,
+    поэтому просроченный токен из кэша не вернется.
+    """
+
+    def get(self, token: str) -> Optional[dict]:
+        return self._get(token)
+
+    def put(self, token: str, claims: dict) -> None:
+        expires_at = claims.get("exp")
+        if expires_at is None:
+            return
+        self._put(token, claims, float(expires_at))
+
+
+class UserCache(_LRUTTLCache):
+    """
+    Пользователи по email с коротким TTL.
+
+    Хранятся отсоединенные копии: объект сессии, загрузившей пользователя,
+    может меняться или истекать вместе с ней. Индекс id -> email нужен для
+    явной инвалидации из мест, где известен только id (изменения баланса).
+    Инвалидация локальна для процесса: в других репликах API устаревание
+    ограничено TTL.
+    """
+
+    def __init__(self, max_items: int, ttl_s: float):
+        super().__init__(max_items)
+        self._ttl_s = ttl_s
+        self._emails: Dict[int, str] = {}
+
+    def get(self, email: str) -> Optional[User]:
+        return self._get(email)
+
+    def put(self, user: User) -> None:
+        snapshot = User(**user.model_dump())
+        make_transient_to_detached(snapshot)
+        self._put(user.email, snapshot, time.time() + self._ttl_s)
+        self._emails[user.id] = user.email
+        if len(self._emails) > 2 * self._max_items:
+            self._emails = {cached.id: email for email, (_, cached) in self._items.items()}
+
+    def invalidate(self, user_id: Optional[int] = None, email: Optional[str] = None) -> None:
+        if user_id is not None:
+            email = self._emails.pop(user_id, None) or email
+        if email is not None:
+            user = self._pop(email)
+            if user is not None:
+                self._emails.pop(user.id, None)
+
+
+settings = Settings()
+token_cache = TokenCache(max_items=settings.AUTH_TOKEN_CACHE_SIZE)
+user_cache = UserCache(max_items=settings.AUTH_USER_CACHE_SIZE, ttl_s=settings.AUTH_USER_CACHE_TTL_S)
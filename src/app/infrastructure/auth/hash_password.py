@@ -1,9 +1,81 @@
+import asyncio
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from config.app_config import Settings
+
+
+settings = Settings()
+T = TypeVar("T")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def needs_rehash(stored_password: str) -> bool:
+    """Пароль хранится открытым текстом (старые записи) или с устаревшей стоимостью."""
+    return pwd_context.identify(stored_password) is None or pwd_context.needs_update(stored_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Очередь на хеширование переполнена или ожидание превысило таймаут."""
+    pass
+
+
+class PasswordHasher:
+    """
+    Хеширование и проверка паролей вне event loop.
+
+    bcrypt отпускает GIL, поэтому пул потоков дает настоящий параллелизм.
+    Одновременно считается не больше max_workers хешей; ожидающих не больше
+    max_queue, и каждый ждет не дольше queue_timeout_s - иначе
+    PasswordHasherBusy, чтобы шквал логинов не копил бесконечную очередь.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout_s: float):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self._slots = asyncio.Semaphore(max_workers)
+        self._max_queue = max_queue
+        self._queue_timeout_s = queue_timeout_s
+        self._waiting = 0
+
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        if self._waiting >= self._max_queue:
+            raise PasswordHasherBusy("Password hashing queue is full")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._queue_timeout_s)
+        except asyncio.TimeoutError:
+            raise PasswordHasherBusy("Timed out waiting for password hashing")
+        finally:
+            self._waiting -= 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, stored_password: str) -> bool:
+        if pwd_context.identify(stored_password) is None:
+            # Старые записи хранят пароль открытым текстом - сравнение без пула
+            return hmac.compare_digest(plain_password.encode(), stored_password.encode())
+        return await self._run(verify_password, plain_password, stored_password)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    queue_timeout_s=settings.PASSWORD_HASH_QUEUE_TIMEOUT_S,
+)
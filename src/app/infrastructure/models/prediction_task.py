@@ -3,8 +3,11 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional, TYPE_CHECKING
 from pydantic import BaseModel
+from sqlalchemy import Column, ForeignKey, Index, LargeBinary
 from sqlmodel import Field, SQLModel, Relationship
 
+from app.infrastructure.models.text_blob import TextBlob  # noqa: F401 - таблица для внешних ключей
+
 if TYPE_CHECKING:
     from app.infrastructure.models.user import User
 
@@ -17,6 +20,10 @@ class TaskStatus(str, Enum):
 
 class PredictionTask(SQLModel, table=True):
     __tablename__ = "prediction_tasks"
+    __table_args__ = (
+        # Keyset-пагинация истории пользователя: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_prediction_tasks_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id: UUID = Field(
         default_factory=uuid4,
@@ -24,7 +31,19 @@ class PredictionTask(SQLModel, table=True):
         index=True
     )
     user_id: int = Field(foreign_key="users.id", nullable=False)
-    input_data: str
+    # Тексты промпта и результата лежат в text_blobs, задача хранит их sha256.
+    # input_hash пуст у задач, еще не перенесенных database.migrate_task_texts
+    input_hash: Optional[bytes] = Field(
+        default=None,
+        sa_column=Column(LargeBinary, ForeignKey("text_blobs.hash", name="fk_prediction_tasks_input_hash"))
+    )
+    result_hash: Optional[bytes] = Field(
+        default=None,
+        sa_column=Column(LargeBinary, ForeignKey("text_blobs.hash", name="fk_prediction_tasks_result_hash"))
+    )
+    # Прежнее хранение текстов: пишется, пока включен TASK_TEXTS_LEGACY_COLUMNS,
+    # читается только для задач без ссылок. Удаляется отдельным релизом после переноса
+    input_data: Optional[str] = None
     result_data: Optional[str] = None
     cost: float # Стоимость выполнения задачи
     status: TaskStatus = Field(default=TaskStatus.PENDING, nullable=False)
@@ -58,4 +77,12 @@ class PredictionResultResponse(SQLModel):
     completed_at: datetime | None
 
 
+class PredictionTaskStatusResponse(SQLModel):
+    """Модель ответа статуса задачи"""
+    id: UUID
+    status: TaskStatus
+    result_data: str | None
+    completed_at: datetime | None
+
+
 # from app.infrastructure.models.user import User
\ No newline at end of file
@@ -0,0 +1,21 @@
+import hashlib
+from sqlalchemy import Column, LargeBinary, Text
+from sqlmodel import Field, SQLModel
+
+
+class TextBlob(SQLModel, table=True):
+    """
+    Текст промпта или результата, хранится один раз на содержимое.
+
+    Ключ - sha256 текста: одинаковые промпты и ответы разных задач
+    ссылаются на одну строку вместо копии в каждой задаче.
+    """
+    __tablename__ = "text_blobs"
+
+    hash: bytes = Field(sa_column=Column(LargeBinary, primary_key=True))
+    body: str = Field(sa_column=Column(Text, nullable=False))
+
+
+def text_hash(text: str) -> bytes:
+    """Ключ текста в text_blobs; совпадает с sha256(convert_to(text, 'UTF8')) в Postgres."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
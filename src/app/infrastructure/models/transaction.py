@@ -1,6 +1,6 @@
 import logging
 from pydantic import BaseModel
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from sqlalchemy.sql.sqltypes import String
 from sqlmodel import SQLModel, Field, Relationship
 from uuid import UUID, uuid4
@@ -20,6 +20,10 @@ class TransactionType(str, Enum):
 
 class UserTransaction(SQLModel, table=True):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Keyset-пагинация истории пользователя: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_transactions_user_id_created_at_id", "user_id", "created_at", "id_transaction"),
+    )
     id_transaction: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
     transaction_amount: float = Field(gt=0, nullable=False)
     type: TransactionType = Field(sa_column=Column(String, nullable=False))
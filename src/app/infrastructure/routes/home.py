@@ -1,6 +1,37 @@
 from typing import Dict
 from fastapi import APIRouter, HTTPException
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+
+from app.infrastructure.auth.cache import token_cache, user_cache
+from app.infrastructure.services.task_status import task_status_cache
+from database.database import pool_stats
+from metrics.registry import CONTENT_TYPE, REGISTRY
+
+
+CACHE_HITS = REGISTRY.counter("cache_hits_total", "In-process cache hits since start", ("cache",))
+CACHE_MISSES = REGISTRY.counter("cache_misses_total", "In-process cache misses since start", ("cache",))
+CACHE_HIT_RATIO = REGISTRY.gauge("cache_hit_ratio", "In-process cache hit ratio since start", ("cache",))
+CACHE_SIZE = REGISTRY.gauge("cache_size", "In-process cache entries", ("cache",))
+
+
+def _process_cache_stats() -> Dict[str, Dict[str, float]]:
+    return {
+        "auth_tokens": token_cache.stats(),
+        "auth_users": user_cache.stats(),
+        "task_status": task_status_cache.stats(),
+    }
+
+
+def _collect_cache_metrics() -> None:
+    for cache, stats in _process_cache_stats().items():
+        # Счетчики ведут сами кэши (только растут с запуска процесса), здесь они лишь переносятся
+        CACHE_HITS.labels(cache).set(stats["hits"])
+        CACHE_MISSES.labels(cache).set(stats["misses"])
+        CACHE_HIT_RATIO.labels(cache).set(stats["hit_ratio"])
+        CACHE_SIZE.labels(cache).set(stats["size"])
+
+
+REGISTRY.on_collect("api_caches", _collect_cache_metrics)
 
 home_route = APIRouter()
 
@@ -48,3 +79,53 @@ async def health_check() -> JSONResponse:
             detail="Service unavailable"
         )
 
+
+
+@home_route.get(
+    "/health/caches",
+    response_model=Dict[str, Dict[str, float]],
+    summary="In-process cache statistics",
+    description="Returns size, hits, misses and hit ratio of the API process caches"
+)
+async def cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Cache statistics of this API process.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Stats per cache
+    """
+    return _process_cache_stats()
+
+
+@home_route.get(
+    "/health/db",
+    summary="Database connection pool statistics",
+    description="Returns pool occupancy, overflow, checkout wait time and checkout latency histogram"
+)
+async def db_pool_stats() -> Dict[str, object]:
+    """
+    Connection pool statistics of this API process.
+
+    Growing checkout latency with idle database means the pool is exhausted;
+    fast checkouts with slow requests point at the database itself.
+
+    Returns:
+        Dict[str, object]: Pool snapshot
+    """
+    return pool_stats()
+
+
+@home_route.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    description="Returns process metrics in Prometheus text exposition format",
+    include_in_schema=False
+)
+async def metrics() -> Response:
+    """
+    Prometheus scrape endpoint of this API process.
+
+    Returns:
+        Response: Metrics in text exposition format
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
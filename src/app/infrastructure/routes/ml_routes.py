@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+from uuid import UUID
+from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
-from database.database import get_session
-from app.infrastructure.services.crud.ml_service import submit_prediction_task, get_prediction_task_history, get_prediction_result_history
-from app.infrastructure.models.prediction_task import PredictionTask, PredictionTaskPublic, PredictionResultResponse
+from database.database import get_session, get_async_task_session
+from app.infrastructure.services.crud.ml_service import submit_prediction_task, submit_prediction_batch, get_prediction_task, get_prediction_task_history, get_prediction_result_history, stream_prediction_history, TASK_HISTORY_COLUMNS
+from app.infrastructure.services.export import encode_rows, EXPORT_MEDIA_TYPES
+from app.infrastructure.models.prediction_task import PredictionTaskPublic, PredictionResultResponse, PredictionTaskStatusResponse
+from app.infrastructure.services.pagination import PageParams
+from app.infrastructure.services.responses import page_response
+from app.infrastructure.services.task_status import task_status_cache, FINAL_STATUSES
+from broker.stream import TaskStream, DONE_EVENT, TOKEN_EVENT
+from config.app_config import Settings
 
 
 ml_router = APIRouter()
+settings = Settings()
 
 # Модель для входных данных запроса
 class PredictionInput(BaseModel):
@@ -16,7 +27,12 @@ class PredictionInput(BaseModel):
     data: str
 
 
-@ml_router.post("/predict", response_model=PredictionTask, status_code=status.HTTP_201_CREATED)
+class PredictionBatchInput(BaseModel):
+    user_id: int
+    data: List[str] = Field(min_length=1, max_length=settings.PREDICT_BATCH_MAX)
+
+
+@ml_router.post("/predict", response_model=PredictionTaskPublic, status_code=status.HTTP_201_CREATED)
 async def request_prediction(
         prediction_input: PredictionInput,
         session: AsyncSession = Depends(get_session)
@@ -34,25 +50,50 @@ async def request_prediction(
     return task
 
 
+@ml_router.post("/predict/batch", response_model=List[UUID], status_code=status.HTTP_201_CREATED)
+async def request_prediction_batch(
+        prediction_input: PredictionBatchInput,
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Ставит в очередь пачку промптов: стоимость всей пачки списывается разом,
+    задачи создаются одной транзакцией. Возвращает идентификаторы задач
+    в порядке входных данных.
+    """
+    tasks = await submit_prediction_batch(
+        user_id=prediction_input.user_id,
+        inputs=prediction_input.data,
+        session=session
+    )
+
+    return [task.id for task in tasks]
+
+
 @ml_router.post( "/{user_id}/predictions",
     response_model=List[PredictionTaskPublic],
     status_code=status.HTTP_200_OK)
 async def api_get_user_tasks(
         user_id: int,
+        page: PageParams = Depends(),
         session: AsyncSession = Depends(get_session)
 ):
     """
-    Возвращает историю всех запросов (задач) ML-модели для указанного пользователя.
+    Возвращает историю запросов (задач) ML-модели для указанного пользователя.
+
+    Постранично, сначала новые: курсор следующей страницы - в заголовке X-Next-Cursor.
     """
-    tasks = await get_prediction_task_history(user_id, session)
+    try:
+        tasks = await get_prediction_task_history(user_id, session, page.limit, page.after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    if not tasks:
+    if not tasks.items and page.after is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No transactions found for user with ID {user_id}"
         )
 
-    return tasks
+    return page_response(tasks)
 
 
 @ml_router.get(
@@ -62,17 +103,186 @@ async def api_get_user_tasks(
 )
 async def get_prediction_history(
         user_id: int,
+        page: PageParams = Depends(),
         session: AsyncSession = Depends(get_session)
 ):
     """
-    Извлекаем список всех завершенных (или всех) задач предсказаний из базы данных.
+    Извлекаем страницу завершенных (или всех) задач предсказаний из базы данных.
     """
-    prediction_results = await get_prediction_result_history(user_id, session)
+    try:
+        prediction_results = await get_prediction_result_history(user_id, session, page.limit, page.after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    if not prediction_results:
+    if not prediction_results.items and page.after is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No predictions were found for the user with the specified ID {user_id}"
         )
 
-    return prediction_results
\ No newline at end of file
+    return page_response(prediction_results)
+
+
+@ml_router.get(
+    "/{user_id}/predictions/export",
+    summary="Export the full prediction history as NDJSON or CSV"
+)
+async def export_prediction_history(
+        user_id: int,
+        export_format: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$")
+):
+    """
+    Выгружает всю историю задач пользователя потоком (сначала новые).
+
+    Строки читаются серверным курсором пачками и сразу отправляются клиенту,
+    поэтому память не зависит от размера истории.
+    """
+    async def rows():
+        # Сессия зависимости закрывается до отправки тела ответа - открываем свою
+        async with get_async_task_session() as session:
+            async for partition in stream_prediction_history(user_id, session, settings.EXPORT_CHUNK_ROWS):
+                yield partition
+
+    fields = [column.key for column in TASK_HISTORY_COLUMNS]
+    return StreamingResponse(
+        encode_rows(rows(), fields, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="predictions-{user_id}.{export_format}"'},
+    )
+
+
+@ml_router.get(
+    "/tasks/{task_id}",
+    response_model=PredictionTaskStatusResponse,
+    summary="Get status and result of a prediction task"
+)
+async def get_prediction_task_status(
+        task_id: UUID,
+        wait: int = Query(default=0, ge=0, description="Long-polling: seconds to wait for completion")
+):
+    """
+    Возвращает статус и результат задачи.
+
+    Завершенные задачи отдаются из кэша статусов, который обновляется
+    событиями завершения; при промахе задача читается по первичному ключу.
+    С ?wait=N запрос ждет завершения задачи до N секунд.
+    """
+    cached = task_status_cache.get(task_id)
+    if cached is not None:
+        return cached
+
+    current = await _read_task_status(task_id)
+    if current is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Prediction task {task_id} not found"
+        )
+    if current.status in FINAL_STATUSES or not wait:
+        return current
+
+    completed = await task_status_cache.wait(task_id, timeout=min(wait, settings.TASK_STATUS_MAX_WAIT_S))
+    if completed is not None:
+        return completed
+    # События не сохраняются брокером: пропущенное событие не должно оставить задачу в pending
+    return await _read_task_status(task_id) or current
+
+
+async def _read_task_status(task_id: UUID) -> Optional[PredictionTaskStatusResponse]:
+    """
+    Читает статус задачи по первичному ключу в короткой сессии: соединение
+    возвращается в пул до ожидания, а не держится весь long-polling.
+    Финальный статус попадает в кэш.
+    """
+    async with get_async_task_session() as session:
+        task = await get_prediction_task(task_id, session)
+    if task is None:
+        return None
+    current = PredictionTaskStatusResponse.model_validate(task, from_attributes=True)
+    task_status_cache.put(current)
+    return current
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _final_task_status(task_id: UUID) -> Optional[PredictionTaskStatusResponse]:
+    """Финальный статус задачи из кэша или БД; None, пока задача не завершена."""
+    current = task_status_cache.get(task_id) or await _read_task_status(task_id)
+    if current is not None and current.status in FINAL_STATUSES:
+        return current
+    return None
+
+
+async def _wait_final_status(task_id: UUID) -> PredictionTaskStatusResponse:
+    """
+    Ждет финальный статус задачи в кэше статусов: его кладет событие
+    завершения DB воркера, уже после коммита результата.
+    """
+    while True:
+        current = await task_status_cache.wait(task_id, timeout=settings.SSE_KEEPALIVE_S)
+        if current is not None:
+            return current
+        # События не сохраняются брокером: пропущенное не должно оставить поток открытым
+        current = await _final_task_status(task_id)
+        if current is not None:
+            return current
+
+
+def _done_event(task: PredictionTaskStatusResponse) -> str:
+    return _sse_event(DONE_EVENT, {
+        "event": DONE_EVENT,
+        "task_id": str(task.id),
+        "status": task.status,
+        "result": task.result_data,
+    })
+
+
+@ml_router.get(
+    "/tasks/{task_id}/stream",
+    summary="Stream generated tokens of a prediction task (Server-Sent Events)"
+)
+async def stream_prediction_task(task_id: UUID):
+    """
+    Транслирует токены генерации задачи по мере их появления (SSE).
+
+    События: token (фрагмент текста) и done (итоговый статус и полный
+    результат). Если задача уже завершена, сразу отдается done.
+    """
+    task = task_status_cache.get(task_id) or await _read_task_status(task_id)
+    if task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Prediction task {task_id} not found"
+        )
+
+    async def events():
+        if task.status in FINAL_STATUSES:
+            yield _done_event(task)
+            return
+
+        async with TaskStream(str(task_id)) as stream:
+            # Токены идут из потока задачи, done - из кэша статусов после коммита результата
+            completion = asyncio.create_task(_wait_final_status(task_id))
+            try:
+                idle_s = 0
+                async for event in stream.events(idle_timeout=settings.SSE_KEEPALIVE_S, until=completion):
+                    if event is None:
+                        idle_s += settings.SSE_KEEPALIVE_S
+                        if idle_s >= settings.SSE_MAX_IDLE_S:
+                            return
+                        yield ": keepalive\n\n"
+                        continue
+                    idle_s = 0
+                    # done прежних версий ML воркера уходил до коммита - его не пересылаем
+                    if event.get("event") == TOKEN_EVENT:
+                        yield _sse_event(TOKEN_EVENT, event)
+                yield _done_event(completion.result())
+            finally:
+                completion.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -5,6 +5,8 @@ from typing import List
 from database.database import get_session
 from app.infrastructure.models.transaction import TransactionResponseItem, TransactionInput
 from app.infrastructure.models.user import UserPublic
+from app.infrastructure.services.pagination import PageParams
+from app.infrastructure.services.responses import page_response
 from app.infrastructure.services.crud.transaction import get_transaction_history, deposit_credits, withdraw_credits
 
 
@@ -63,16 +65,21 @@ async def api_withdraw_credits(
 )
 async def api_get_transaction_history(
         user_id: int,
+        page: PageParams = Depends(),
         session: AsyncSession = Depends(get_session)
 ):
     """
-    Возвращает полную историю транзакций для указанного пользователя.
+    Возвращает историю транзакций для указанного пользователя постранично (сначала новые).
+    Курсор следующей страницы передается в заголовке X-Next-Cursor.
     """
-    history = await get_transaction_history(user_id, session)
+    try:
+        history = await get_transaction_history(user_id, session, page.limit, page.after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    if not history:
+    if not history.items and page.after is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No transactions found for user with ID {user_id}"
         )
-    return history
\ No newline at end of file
+    return page_response(history)
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Response, status, Depends
 from typing import List, Dict, Sequence
 import logging
+from sqlalchemy.exc import SQLAlchemyError
 
 from database.database import get_session
 from app.infrastructure.models.user import User, UserSignin
+from app.infrastructure.auth.hash_password import password_hasher, needs_rehash, PasswordHasherBusy
 from app.infrastructure.services.crud import user as UserService
+from app.infrastructure.services.pagination import PageParams
 
 
 logger = logging.getLogger(__name__)
 
 user_route = APIRouter()
 
+def _busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is busy, retry later",
+        headers={"Retry-After": "1"},
+    )
+
+
 @user_route.post(
     '/signup',
     response_model=Dict[str, str],
@@ -43,7 +54,7 @@ async def signup(data: User, session=Depends(get_session)) -> Dict[str, str]:
         user = User(
             id=data.id,
             email=data.email,
-            password=data.password,
+            password=await password_hasher.hash(data.password),
             full_name=data.full_name,
             credits=data.credits,
             is_active=data.is_active,
@@ -52,6 +63,11 @@ async def signup(data: User, session=Depends(get_session)) -> Dict[str, str]:
         logger.info(f"New user registered: {data.email}")
         return {"message": "User successfully registered"}
 
+    except HTTPException:
+        raise
+    except PasswordHasherBusy as e:
+        logger.warning(f"Signup rejected, password hasher is busy: {e}")
+        raise _busy_exception()
     except Exception as e:
         logger.error(f"Error during signup: {str(e)}")
         raise HTTPException(
@@ -80,36 +96,72 @@ async def signin(data: UserSignin, session=Depends(get_session)) -> Dict[str, st
         logger.warning(f"Login attempt with non-existent email: {data.email}")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User does not exist")
     
-    if user.password != data.password:
+    try:
+        valid = await password_hasher.verify(data.password, user.password)
+    except PasswordHasherBusy as e:
+        logger.warning(f"Signin rejected, password hasher is busy: {e}")
+        raise _busy_exception()
+
+    if not valid:
         logger.warning(f"Failed login attempt for user: {data.email}")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Wrong credentials passed")
 
+    if needs_rehash(user.password):
+        await _rehash_password(user, data.password, session)
+
     return {"message": "User signed in successfully"}
 
 
+async def _rehash_password(user: User, password: str, session) -> None:
+    """
+    Перехеширует старый открытый пароль или хеш с прежней стоимостью.
+
+    Не обязательно для входа: при занятом хешере или ошибке БД пароль
+    останется прежним и перехешируется при следующем входе.
+    """
+    try:
+        user.password = await password_hasher.hash(password)
+        session.add(user)
+        await session.commit()
+    except PasswordHasherBusy as e:
+        logger.warning(f"Password rehash skipped for user {user.email}, hasher is busy: {e}")
+    except SQLAlchemyError as e:
+        await session.rollback()
+        logger.error(f"Password rehash failed for user {user.email}: {e}")
+
+
 @user_route.get(
     "/users",
     response_model=List[User],
     summary="Get all users",
-    response_description="List of all users"
+    response_description="Page of users, next cursor in the X-Next-Cursor header"
 )
-async def get_all_users(session=Depends(get_session)) -> Sequence[User]:
+async def get_all_users(
+        response: Response,
+        page: PageParams = Depends(),
+        session=Depends(get_session)
+) -> Sequence[User]:
     """
-    Get list of all users.
+    Get a page of users ordered by ID.
 
     Args:
+        response: Response used to return the X-Next-Cursor header
+        page: Pagination parameters (limit, after)
         session: Database session
 
     Returns:
         List[UserResponse]: List of users
     """
     try:
-        users = await UserService.get_all_users(session)
-        logger.info(f"Retrieved {len(users)} users")
-        return users
+        users = await UserService.get_all_users(session, page.limit, page.after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving users: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error retrieving users"
         )
+    logger.info(f"Retrieved {len(users.items)} users")
+    users.set_headers(response)
+    return users.items
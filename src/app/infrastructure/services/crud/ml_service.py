@@ -1,16 +1,24 @@
+from typing import AsyncIterator, List, Optional, Sequence
+from uuid import UUID
 from fastapi import HTTPException, status
-from sqlalchemy import Sequence
+from sqlalchemy import Row, func, tuple_
+from sqlalchemy.orm import aliased
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
-from aio_pika import connect_robust, Message, DeliveryMode
 
-from app.infrastructure.models.prediction_task import PredictionTask, TaskStatus
-from app.infrastructure.services.crud.transaction import withdraw_credits
-from config.app_config import Settings, TASK_QUEUE
+from app.infrastructure.auth.cache import user_cache
+from app.infrastructure.models.prediction_task import PredictionTask, PredictionTaskPublic, TaskStatus
+from app.infrastructure.models.text_blob import TextBlob
+from app.infrastructure.services.crud.text_blob import store_texts
+from app.infrastructure.services.crud.user import debit_credits
+from app.infrastructure.services.pagination import Page, build_page, decode_time_id_cursor
+from broker import envelope
+from broker.transport import get_transport
+from config.app_config import Settings, TASK_QUEUE, TASK_PRIORITY_BATCH, TASK_PRIORITY_INTERACTIVE
 
 
 settings = Settings()
-BROKER_URL = settings.RABBITMQ_URL
+
 
 # Устанавливаем цену за предсказание
 PREDICTION_COST = 5.0
@@ -20,61 +28,215 @@ async def submit_prediction_task(
         user_id: int,
         input_data: str,
         session: AsyncSession
-) -> PredictionTask:
-    # 1. Списание средств за выполнение задачи
+) -> PredictionTaskPublic:
+    """
+    Списывает стоимость и регистрирует задачу одной транзакцией БД, затем
+    ставит задачу в очередь.
+    """
+    # 1. Списание средств за выполнение задачи (условный UPDATE, без коммита)
     try:
-        await withdraw_credits(user_id, PREDICTION_COST, session)
+        await debit_credits(user_id, PREDICTION_COST, session)
 
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    # 2. Регистрация задачи в базе данных
+    # 2. Регистрация задачи в той же транзакции: id и created_at заполняются на клиенте,
+    # поэтому refresh после коммита не нужен. Текст промпта - в text_blobs
+    hashes = await store_texts([input_data], session)
     task = PredictionTask(
         user_id=user_id,
-        input_data=input_data,
+        input_hash=hashes[input_data],
+        input_data=input_data if settings.TASK_TEXTS_LEGACY_COLUMNS else None,
         cost=PREDICTION_COST,
         status=TaskStatus.PENDING
     )
 
     session.add(task)
     await session.commit()
-    await session.refresh(task)
-
-    # 3. Отправили задачи в очередь
-    connection = await connect_robust(BROKER_URL)
-    async with connection:
-        channel = await connection.channel()
-        # Объявляем очередь task_queue
-        await channel.default_exchange.publish(
-            Message(
-                body=f'{{"task_id": "{task.id}", "data": "{input_data}"}}'.encode(),
-                delivery_mode=DeliveryMode.PERSISTENT
-            ),
-            routing_key=TASK_QUEUE
-        )
-    return task
+    user_cache.invalidate(user_id=user_id)
+
+    # 3. Отправили задачи в очередь через общий публикатор процесса
+    await get_transport().publish(TASK_QUEUE, _task_message(task, input_data), priority=TASK_PRIORITY_INTERACTIVE)
+    return task_public(task, input_data)
 
 
-async def get_prediction_task_history(user_id: int, session: AsyncSession) -> Sequence[PredictionTask]:
+async def submit_prediction_batch(
+        user_id: int,
+        inputs: List[str],
+        session: AsyncSession
+) -> List[PredictionTask]:
     """
-    Получает все задачи предсказания ML-модели для конкретного пользователя.
+    Пакетная постановка задач: одно списание на всю пачку, одна вставка
+    задач, один коммит и публикация всех сообщений на одном канале.
     """
-    statement = (
-        select(PredictionTask)
-        .where(PredictionTask.user_id == user_id)
-        .order_by(PredictionTask.created_at.desc()) # Сначала новые задачи
+    try:
+        await debit_credits(user_id, PREDICTION_COST * len(inputs), session)
+
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # Повторяющиеся промпты пачки сохраняются одной строкой text_blobs
+    hashes = await store_texts(inputs, session)
+    tasks = [
+        PredictionTask(
+            user_id=user_id,
+            input_hash=hashes[input_data],
+            input_data=input_data if settings.TASK_TEXTS_LEGACY_COLUMNS else None,
+            cost=PREDICTION_COST,
+            status=TaskStatus.PENDING
+        )
+        for input_data in inputs
+    ]
+    # Первичные ключи генерируются на клиенте - вставка уходит одним executemany
+    session.add_all(tasks)
+    await session.commit()
+    user_cache.invalidate(user_id=user_id)
+
+    # Пачка идет младшим классом: одиночные запросы других пользователей не ждут ее целиком
+    await get_transport().publish_many(
+        TASK_QUEUE, [_task_message(task, input_data) for task, input_data in zip(tasks, inputs)],
+        priority=TASK_PRIORITY_BATCH
     )
-    result = await session.execute(statement)
-    tasks = result.scalars().all()
     return tasks
 
 
-async def get_prediction_result_history(user_id: int, session: AsyncSession) -> Sequence[PredictionTask]:
+def task_public(task: PredictionTask, input_data: str) -> PredictionTaskPublic:
+    """Ответ о только что созданной задаче: текст промпта известен, читать его из БД не нужно."""
+    return PredictionTaskPublic(
+        id=task.id,
+        user_id=task.user_id,
+        input_data=input_data,
+        result_data=None,
+        cost=task.cost,
+        status=task.status,
+        created_at=task.created_at,
+        completed_at=task.completed_at,
+    )
+
+
+def _task_message(task: PredictionTask, input_data: str) -> bytes:
+    return envelope.encode({"task_id": task.id, "user_id": task.user_id, "data": input_data})
+
+
+# Тексты задачи подтягиваются join-ом с text_blobs только в те выборки, чьим ответам они нужны.
+# У задач без ссылок (записаны прежней версией, еще не перенесены) текст берется из старой колонки
+input_text = aliased(TextBlob, name="input_text")
+result_text = aliased(TextBlob, name="result_text")
+INPUT_DATA = func.coalesce(input_text.body, PredictionTask.input_data).label("input_data")
+RESULT_DATA = func.coalesce(result_text.body, PredictionTask.result_data).label("result_data")
+
+# Колонки ответов истории: выбираем только то, что сериализуется, без ORM-объектов
+TASK_HISTORY_COLUMNS = (
+    PredictionTask.id,
+    PredictionTask.user_id,
+    INPUT_DATA,
+    RESULT_DATA,
+    PredictionTask.cost,
+    PredictionTask.status,
+    PredictionTask.created_at,
+    PredictionTask.completed_at,
+)
+RESULT_HISTORY_COLUMNS = (
+    PredictionTask.id,
+    PredictionTask.status,
+    RESULT_DATA,
+    PredictionTask.created_at,
+    PredictionTask.completed_at,
+)
+TASK_STATUS_COLUMNS = (
+    PredictionTask.id,
+    PredictionTask.status,
+    RESULT_DATA,
+    PredictionTask.completed_at,
+)
+
+
+def _select_task_history():
+    return (
+        select(*TASK_HISTORY_COLUMNS)
+        .select_from(PredictionTask)
+        .outerjoin(input_text, input_text.hash == PredictionTask.input_hash)
+        .outerjoin(result_text, result_text.hash == PredictionTask.result_hash)
+    )
+
+
+def _select_with_result(*columns):
+    return (
+        select(*columns)
+        .select_from(PredictionTask)
+        .outerjoin(result_text, result_text.hash == PredictionTask.result_hash)
+    )
+
+
+async def get_prediction_task(task_id: UUID, session: AsyncSession) -> Optional[Row]:
+    """
+    Получает статус задачи предсказания по идентификатору (id, status,
+    result_data, completed_at). Промпт не читается.
+    """
+    result = await session.execute(_select_with_result(*TASK_STATUS_COLUMNS).where(PredictionTask.id == task_id))
+    return result.first()
+
+
+async def get_prediction_task_history(
+        user_id: int,
+        session: AsyncSession,
+        limit: int,
+        after: Optional[str] = None
+) -> Page[Row]:
+    """
+    Получает страницу задач предсказания ML-модели для конкретного пользователя.
+    """
+    statement = _history_statement(_select_task_history(), user_id, after).limit(limit + 1)
+    result = await session.execute(statement)
+    tasks = result.all()
+    return build_page(tasks, limit, key=lambda task: (task.created_at, task.id))
+
+
+async def get_prediction_result_history(
+        user_id: int,
+        session: AsyncSession,
+        limit: int,
+        after: Optional[str] = None
+) -> Page[Row]:
     """
-        Получает все результаты предсказаний ML-модели для конкретного пользователя.
+        Получает страницу результатов предсказаний ML-модели для конкретного пользователя.
+        Текст промпта не читается: join только с текстом результата.
         """
-    statement = (select(PredictionTask)
-                 .where(PredictionTask.user_id == user_id))
+    statement = _history_statement(_select_with_result(*RESULT_HISTORY_COLUMNS), user_id, after).limit(limit + 1)
     results = await session.execute(statement)
-    prediction_results = results.scalars().all()
-    return prediction_results
\ No newline at end of file
+    prediction_results = results.all()
+    return build_page(prediction_results, limit, key=lambda task: (task.created_at, task.id))
+
+
+async def stream_prediction_history(
+        user_id: int,
+        session: AsyncSession,
+        chunk_rows: int
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Вся история задач пользователя пачками по chunk_rows строк через серверный курсор.
+
+    В памяти одновременно держится только одна пачка, независимо от размера истории.
+    """
+    statement = _history_statement(_select_task_history(), user_id).execution_options(yield_per=chunk_rows)
+    result = await session.stream(statement)
+    async for partition in result.partitions():
+        yield partition
+
+
+def _history_statement(statement, user_id: int, after: Optional[str] = None):
+    """
+    Keyset-выборка истории: сначала новые задачи, стабильный порядок по (created_at, id),
+    покрывается индексом ix_prediction_tasks_user_id_created_at_id.
+    """
+    statement = (
+        statement
+        .where(PredictionTask.user_id == user_id)
+        .order_by(PredictionTask.created_at.desc(), PredictionTask.id.desc())
+    )
+    if after is not None:
+        created_at, task_id = decode_time_id_cursor(after)
+        statement = statement.where(
+            tuple_(PredictionTask.created_at, PredictionTask.id) < tuple_(created_at, task_id)
+        )
+    return statement
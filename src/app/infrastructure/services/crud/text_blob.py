@@ -0,0 +1,26 @@
+from typing import Dict, Iterable
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.infrastructure.models.text_blob import TextBlob, text_hash
+
+
+async def store_texts(texts: Iterable[str], session: AsyncSession) -> Dict[str, bytes]:
+    """
+    Сохраняет тексты в text_blobs (без коммита) и возвращает их ключи.
+
+    Уже сохраненные тексты не перезаписываются: INSERT ... ON CONFLICT DO
+    NOTHING, поэтому повторный промпт стоит одного поиска по первичному ключу.
+    Строки вставляются в порядке ключей, чтобы параллельные транзакции с
+    общими текстами не ждали друг друга крест-накрест.
+    """
+    hashes = {text: text_hash(text) for text in texts}
+    if not hashes:
+        return hashes
+
+    dialect = sqlite if session.get_bind().dialect.name == "sqlite" else postgresql
+    rows = sorted(({"hash": key, "body": text} for text, key in hashes.items()), key=lambda row: row["hash"])
+    statement = dialect.insert(TextBlob).values(rows).on_conflict_do_nothing(index_elements=["hash"])
+    await session.execute(statement)
+    return hashes
+
@@ -1,11 +1,13 @@
 import logging
-from typing import Sequence
+from typing import Optional
+from sqlalchemy import Row, tuple_
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 
 from app.infrastructure.models.transaction import UserTransaction
 from app.infrastructure.services.crud.user import update_user_balance
 from app.infrastructure.models.user import User
+from app.infrastructure.services.pagination import Page, build_page, decode_time_id_cursor
 
 
 logger = logging.getLogger(__name__)
@@ -21,10 +23,32 @@ async def withdraw_credits(user_id: int, amount: float, session: AsyncSession) -
     return await update_user_balance(user_id, amount, session, operation='withdrawal')
 
 
-async def get_transaction_history(user_id: int, session: AsyncSession) -> Sequence[UserTransaction]:
-    """Получение истории транзакций пользователя"""
-    stmt = select(UserTransaction).where(UserTransaction.user_id == user_id)
-    result = await session.execute(stmt)
-    transactions = result.scalars().all()
-    return transactions
-
+# Колонки ответа истории транзакций (TransactionResponseItem)
+TRANSACTION_HISTORY_COLUMNS = (
+    UserTransaction.id_transaction,
+    UserTransaction.transaction_amount,
+    UserTransaction.type,
+    UserTransaction.created_at,
+)
+
+
+async def get_transaction_history(
+        user_id: int,
+        session: AsyncSession,
+        limit: int,
+        after: Optional[str] = None
+) -> Page[Row]:
+    """Получение страницы истории транзакций пользователя (сначала новые)"""
+    stmt = (
+        select(*TRANSACTION_HISTORY_COLUMNS)
+        .where(UserTransaction.user_id == user_id)
+        .order_by(UserTransaction.created_at.desc(), UserTransaction.id_transaction.desc())
+    )
+    if after is not None:
+        created_at, transaction_id = decode_time_id_cursor(after)
+        stmt = stmt.where(
+            tuple_(UserTransaction.created_at, UserTransaction.id_transaction) < tuple_(created_at, transaction_id)
+        )
+    result = await session.execute(stmt.limit(limit + 1))
+    transactions = result.all()
+    return build_page(transactions, limit, key=lambda item: (item.created_at, item.id_transaction))
@@ -1,31 +1,38 @@
 from fastapi import HTTPException
 from sqlalchemy.exc import SQLAlchemyError
 from starlette import status
+from sqlalchemy import update
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import List, Optional, Sequence
+from typing import List, Optional
 
+from app.infrastructure.auth.cache import user_cache
 from app.infrastructure.models.user import User
 from app.infrastructure.models.transaction import UserTransaction, TransactionType
+from app.infrastructure.services.pagination import Page, build_page, decode_int_cursor
 
 
 class InsufficientFundsError(Exception):
     """Пользовательская ошибка: недостаточно средств на балансе."""
     pass
 
-async def get_all_users(session: AsyncSession) -> Sequence[User]:
+async def get_all_users(session: AsyncSession, limit: int, after: Optional[str] = None) -> Page[User]:
     """
     Args:
         session: Database session
+        limit: Page size
+        after: Cursor of the previous page
 
     Returns:
-        List[User]: List of all users
+        Page[User]: Page of users ordered by ID
     """
     try:
-        statement = select(User)
-        result = await session.execute(statement)
+        statement = select(User).order_by(User.id)
+        if after is not None:
+            statement = statement.where(User.id > decode_int_cursor(after))
+        result = await session.execute(statement.limit(limit + 1))
         users = result.scalars().all()
-        return users
+        return build_page(users, limit, key=lambda user: (user.id,))
     except Exception as e:
         raise
 
@@ -175,6 +182,7 @@ async def delete_user(user_id: int, session: AsyncSession) -> bool | None:
         if user:
             await session.delete(user)
             await session.commit()
+            user_cache.invalidate(user_id=user_id, email=user.email)
             return True
         return False
     except Exception as e:
@@ -200,47 +208,74 @@ async def create_transaction_record(
     return transaction
 
 
-async def update_user_balance(user_id: int, amount: float, session: AsyncSession, operation: str) -> User:
+async def debit_credits(user_id: int, amount: float, session: AsyncSession) -> float:
     """
-      Обновляет баланс пользователя и создает запись о транзакции.
-      """
+    Атомарно списывает amount с баланса и добавляет запись о транзакции в сессию (без коммита).
+    После коммита вызывающий код сбрасывает пользователя в user_cache.
 
-    # 1. Находим пользователя в базе данных
-    user_stmt = select(User).where(User.id == user_id)
-    result = await session.execute(user_stmt)
-    user = result.scalar_one_or_none()
+    Проверка баланса и списание - один условный UPDATE ... RETURNING, поэтому
+    параллельные списания одного пользователя не уводят баланс в минус.
+    Возвращает новый баланс.
+    """
+    stmt = (
+        update(User)
+        .where(User.id == user_id, User.credits >= amount)
+        .values(credits=User.credits - amount)
+        .returning(User.credits)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    credits = result.scalar_one_or_none()
+    if credits is None:
+        await _raise_debit_error(user_id, session)
 
-    if not user:
+    await create_transaction_record(user_id, amount, TransactionType.EXPENSE, session)
+    return credits
+
+
+async def _raise_debit_error(user_id: int, session: AsyncSession) -> None:
+    """Условие списания не выполнено: отличаем отсутствующего пользователя от нехватки средств."""
+    result = await session.execute(select(User.id).where(User.id == user_id))
+    if result.scalar_one_or_none() is None:
         raise ValueError(f"User with id {user_id} not found")
+    raise ValueError("Insufficient funds")
+
+
+async def update_user_balance(user_id: int, amount: float, session: AsyncSession, operation: str) -> User:
+    """
+      Обновляет баланс пользователя и создает запись о транзакции.
 
-    # 2. Определяем тип транзакции из Enum
+      Баланс меняется одним UPDATE ... RETURNING на стороне БД (без чтения
+      и пересчета в Python), списание - только при достаточном балансе.
+      """
+
+    # 1. Определяем тип транзакции из Enum
     transaction_type = TransactionType.INCOME if operation == 'deposit' else TransactionType.EXPENSE
 
-    # 3. Рассчитываем новый баланс
+    # 2. Изменяем баланс в БД
+    stmt = update(User).where(User.id == user_id)
     if transaction_type == TransactionType.INCOME:
-        user.credits += amount
-    elif transaction_type == TransactionType.EXPENSE:
-        if user.credits < amount:
-            raise ValueError("Insufficient funds")
-        user.credits -= amount
+        stmt = stmt.values(credits=User.credits + amount)
+    else:
+        stmt = stmt.where(User.credits >= amount).values(credits=User.credits - amount)
+    stmt = stmt.returning(User).execution_options(synchronize_session=False, populate_existing=True)
+
+    result = await session.execute(stmt)
+    user = result.scalar_one_or_none()
+
+    if not user:
+        if transaction_type == TransactionType.INCOME:
+            raise ValueError(f"User with id {user_id} not found")
+        await _raise_debit_error(user_id, session)
 
     try:
-        # 4. Создаем запись о транзакции
-        transaction = UserTransaction(
-            transaction_amount=amount,
-            type=transaction_type,
-            user_id=user_id
-        )
-
-        # 5. Добавляем и фиксируем изменения в рамках одной атомарной операции (транзакции БД)
-        session.add(user)
-        session.add(transaction)
+        # 3. Создаем запись о транзакции и фиксируем обе записи одной транзакцией БД
+        await create_transaction_record(user_id, amount, transaction_type, session)
         await session.commit()
-        await session.refresh(user)
+        user_cache.invalidate(user_id=user_id)
 
         return user
 
     except SQLAlchemyError as e:
         await session.rollback()
         raise RuntimeError(f"Database operation failed: {e}")
-
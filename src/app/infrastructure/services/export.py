@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Sequence
+from uuid import UUID
+
+from sqlalchemy import Row
+
+
+# Поддерживаемые форматы выгрузки и их media type
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+async def _ndjson(partitions: AsyncIterator[Sequence[Row]], fields: Sequence[str]) -> AsyncIterator[str]:
+    async for rows in partitions:
+        yield "".join(
+            json.dumps({field: _plain(value) for field, value in zip(fields, row)}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+async def _csv(partitions: AsyncIterator[Sequence[Row]], fields: Sequence[str]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+
+
+def encode_rows(
+        partitions: AsyncIterator[Sequence[Row]],
+        fields: Sequence[str],
+        export_format: str
+) -> AsyncIterator[str]:
+    """
+    Кодирует пачки строк выборки в NDJSON или CSV по мере их поступления:
+    одна пачка - один фрагмент тела ответа.
+    """
+    if export_format == "csv":
+        return _csv(partitions, fields)
+    return _ndjson(partitions, fields)
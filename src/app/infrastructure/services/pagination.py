@@ -0,0 +1,89 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+from uuid import UUID
+
+from fastapi import Query, Response
+
+from config.app_config import Settings
+
+
+settings = Settings()
+T = TypeVar("T")
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """Непрозрачный курсор: base64url от JSON значений ключа сортировки."""
+    raw = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    """Раскодирует курсор; ValueError, если он поврежден."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid pagination cursor")
+    return values
+
+
+def decode_time_id_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Курсор (created_at, uuid) для историй, отсортированных от новых к старым."""
+    created_at, row_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except ValueError:
+        raise ValueError("Invalid pagination cursor")
+
+
+def decode_int_cursor(cursor: str) -> int:
+    (row_id,) = decode_cursor(cursor, 1)
+    try:
+        return int(row_id)
+    except ValueError:
+        raise ValueError("Invalid pagination cursor")
+
+
+@dataclass
+class Page(Generic[T]):
+    """Страница выборки и курсор следующей (None - страниц больше нет)."""
+    items: Sequence[T]
+    next_cursor: Optional[str]
+
+    def set_headers(self, response: Response) -> None:
+        if self.next_cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = self.next_cursor
+
+
+def build_page(rows: Sequence[T], limit: int, key: Callable[[T], tuple]) -> Page[T]:
+    """Строит страницу из limit + 1 строк: лишняя строка означает, что есть продолжение."""
+    if len(rows) <= limit:
+        return Page(items=rows, next_cursor=None)
+    items = rows[:limit]
+    return Page(items=items, next_cursor=encode_cursor(*key(items[-1])))
+
+
+class PageParams:
+    """Параметры keyset-пагинации списка: ?limit=&after=."""
+
+    def __init__(
+            self,
+            limit: int = Query(
+                default=settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX,
+                description="Page size"
+            ),
+            after: Optional[str] = Query(
+                default=None,
+                description=f"Cursor from the {NEXT_CURSOR_HEADER} header of the previous page"
+            )
+    ):
+        self.limit = limit
+        self.after = after
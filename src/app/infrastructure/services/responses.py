@@ -0,0 +1,30 @@
+from typing import Sequence
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Row
+
+from app.infrastructure.services.pagination import Page, NEXT_CURSOR_HEADER
+
+
+class RowsResponse(ORJSONResponse):
+    """
+    Список строк выборки в JSON напрямую через orjson, без response_model.
+
+    Колонки выборки совпадают с полями схемы ответа, а типы строк задает
+    база, поэтому промежуточные Pydantic-объекты на каждую строку не нужны:
+    UUID, datetime и Enum orjson сериализует сам. Схема ответа в OpenAPI
+    по-прежнему описывается response_model роута.
+    """
+
+    def render(self, content: Sequence[Row]) -> bytes:
+        if not content:
+            return b"[]"
+        fields = content[0]._fields
+        return orjson.dumps([dict(zip(fields, row)) for row in content])
+
+
+def page_response(page: Page[Row]) -> RowsResponse:
+    """Ответ со страницей строк и курсором следующей страницы в заголовке."""
+    headers = {NEXT_CURSOR_HEADER: page.next_cursor} if page.next_cursor is not None else None
+    return RowsResponse(page.items, headers=headers)
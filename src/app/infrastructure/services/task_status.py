@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from app.infrastructure.models.prediction_task import PredictionTaskStatusResponse, TaskStatus
+from broker.events import TaskEventsConsumer
+from config.app_config import Settings
+
+
+FINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED)
+
+
+class TaskStatusCache:
+    """
+    Кэш завершенных задач в памяти процесса API.
+
+    Хранятся только финальные статусы: они больше не меняются, поэтому кэш
+    не расходится с БД. Ожидающие long-polling запросы будятся при put.
+    """
+
+    def __init__(self, max_items: int, ttl_s: float):
+        self._max_items = max_items
+        self._ttl_s = ttl_s
+        self._items: OrderedDict[UUID, tuple[float, PredictionTaskStatusResponse]] = OrderedDict()
+        self._waiters: Dict[UUID, list] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, task_id: UUID) -> Optional[PredictionTaskStatusResponse]:
+        item = self._items.get(task_id)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[task_id]
+            self.misses += 1
+            return None
+        self._items.move_to_end(task_id)
+        self.hits += 1
+        return item[1]
+
+    def put(self, task: PredictionTaskStatusResponse) -> None:
+        if task.status not in FINAL_STATUSES:
+            return
+        self._items[task.id] = (time.monotonic() + self._ttl_s, task)
+        self._items.move_to_end(task.id)
+        while len(self._items) > self._max_items:
+            self._items.popitem(last=False)
+
+        waiter = self._waiters.get(task.id)
+        if waiter is not None:
+            waiter[0].set()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    async def wait(self, task_id: UUID, timeout: float) -> Optional[PredictionTaskStatusResponse]:
+        """Ждет финальный статус задачи не дольше timeout секунд."""
+        # Событие могло прийти между чтением из БД и вызовом wait - оно уже в кэше
+        cached = self.get(task_id)
+        if cached is not None:
+            return cached
+
+        waiter = self._waiters.setdefault(task_id, [asyncio.Event(), 0])
+        waiter[1] += 1
+        try:
+            await asyncio.wait_for(waiter[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiter[1] -= 1
+            if waiter[1] == 0:
+                self._waiters.pop(task_id, None)
+        return self.get(task_id)
+
+    async def on_task_events(self, events: List[dict]) -> None:
+        """Обработчик событий завершения из fanout."""
+        for event in events:
+            completed_at = event.get("completed_at")
+            self.put(PredictionTaskStatusResponse(
+                id=UUID(event["task_id"]),
+                status=TaskStatus(event["status"]),
+                result_data=event.get("result"),
+                completed_at=datetime.fromisoformat(completed_at) if completed_at else None,
+            ))
+
+
+settings = Settings()
+task_status_cache = TaskStatusCache(
+    max_items=settings.TASK_STATUS_CACHE_SIZE,
+    ttl_s=settings.TASK_STATUS_CACHE_TTL_S,
+)
+_consumer: Optional[TaskEventsConsumer] = None
+
+
+async def start_task_status_updates() -> None:
+    """Подписывает кэш статусов на события завершения (на старте API)."""
+    global _consumer
+    if _consumer is None:
+        _consumer = TaskEventsConsumer(task_status_cache.on_task_events)
+        await _consumer.start()
+
+
+async def stop_task_status_updates() -> None:
+    global _consumer
+    if _consumer is not None:
+        await _consumer.stop()
+        _consumer = None
@@ -0,0 +1,28 @@
+"""Общие помощники бенчмарков: перцентили и печать сводки."""
+import math
+from typing import Dict, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Перцентиль q (0..100) по методу ближайшего ранга."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarize(latencies_s: Sequence[float]) -> Dict[str, float]:
+    """Сводка латентностей в миллисекундах."""
+    return {
+        "count": len(latencies_s),
+        "p50_ms": percentile(latencies_s, 50) * 1000,
+        "p95_ms": percentile(latencies_s, 95) * 1000,
+        "p99_ms": percentile(latencies_s, 99) * 1000,
+        "max_ms": max(latencies_s) * 1000 if latencies_s else float("nan"),
+    }
+
+
+def format_row(name: str, summary: Dict[str, float]) -> str:
+    return (f"{name:<24} n={summary['count']:<6} p50={summary['p50_ms']:8.2f}ms "
+            f"p95={summary['p95_ms']:8.2f}ms p99={summary['p99_ms']:8.2f}ms")
@@ -0,0 +1,99 @@
+"""
+Пропускная способность записи результатов DB воркером (строк/с) при разных
+размерах батча. Батч размера 1 соответствует прежней записи по одной.
+
+Нужна локальная база из .env. Для прогона создаются пользователь и
+--rows задач в статусе pending на каждый размер батча.
+
+Запуск (из каталога src):
+    python -m benchmarks.db_write_throughput --rows 5000 --batch-sizes 1 10 100 500
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from app.infrastructure.models.prediction_task import PredictionTask, TaskStatus
+from app.infrastructure.models.user import User
+from app.infrastructure.services.crud import user as UserService
+from app.infrastructure.services.crud.text_blob import store_texts
+from broker import envelope
+from database import database
+from worker.db import db_worker
+
+
+class FakeMessage:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.acked = False
+
+    async def ack(self):
+        self.acked = True
+
+    async def nack(self, requeue: bool = True):
+        pass
+
+    async def reject(self, requeue: bool = False):
+        pass
+
+
+async def seed_tasks(user_id: int, rows: int) -> list[uuid.UUID]:
+    async with database.AsyncSessionLocal() as session:
+        hashes = await store_texts(["bench"], session)
+        tasks = [PredictionTask(user_id=user_id, input_hash=hashes["bench"], cost=0.0) for _ in range(rows)]
+        session.add_all(tasks)
+        await session.commit()
+        return [task.id for task in tasks]
+
+
+async def run_once(task_ids: list[uuid.UUID], batch_size: int) -> float:
+    messages = [
+        FakeMessage(envelope.encode({
+            "task_id": task_id,
+            "status": TaskStatus.COMPLETED,
+            "result": "bench result " * 8,
+        }))
+        for task_id in task_ids
+    ]
+    started = time.perf_counter()
+    for i in range(0, len(messages), batch_size):
+        await db_worker.on_message_db_batch(messages[i:i + batch_size])
+    elapsed = time.perf_counter() - started
+    assert all(message.acked for message in messages)
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 500])
+    args = parser.parse_args()
+
+    async def skip_events(events):
+        pass
+
+    # Замеряем только запись в БД, без рассылки событий завершения
+    db_worker.publish_task_events = skip_events
+
+    await database.get_database_engine()
+    await database.init_db(drop_all=False)
+    async with database.AsyncSessionLocal() as session:
+        user = await UserService.create_user(User(
+            full_name="bench",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="bench",
+            is_active=True,
+            is_superuser=False,
+        ), session)
+
+    print(f"{'batch':>6} {'rows/s':>10} {'elapsed, s':>11}")
+    for batch_size in args.batch_sizes:
+        task_ids = await seed_tasks(user.id, args.rows)
+        elapsed = await run_once(task_ids, batch_size)
+        print(f"{batch_size:>6} {args.rows / elapsed:>10.1f} {elapsed:>11.2f}")
+
+    await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,363 @@
+"""
+Сквозной бенчмарк: API (create_application), ML воркер и DB воркер в одном
+процессе на локальных заменах - транспорт в памяти (broker.inprocess), SQLite (или Postgres из
+.env) и FakeLlama с задержкой на токен.
+
+Клиенты выполняют смесь запросов (predict, history, deposit). Для predict
+замеряется путь submit -> result: POST /predict и long-polling
+GET /tasks/{id}?wait= до финального статуса. Отчет: пропускная
+способность, p50/p95/p99 по операциям, сквозная латентность и время
+по стадиям конвейера; полный результат пишется в JSON для сравнения
+между коммитами.
+
+Стадии predict:
+    submit_http   - POST /predict (списание, вставка задачи, публикация)
+    task_queue    - ожидание в task_queue до начала батча ML
+    inference     - батч ML до публикации результата (включая соседей по батчу)
+    db_queue      - ожидание в db_queue до начала батча записи
+    db_write      - запись батча до события завершения
+    notify        - от события завершения до ответа клиенту
+    prefill/decode - время генерации по данным воркера
+
+Запуск (из каталога src):
+    python -m benchmarks.e2e_latency --requests 2000 --concurrency 32 \\
+        --mix predict=0.7,history=0.2,deposit=0.1 --token-ms 1 --output e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api import create_application
+from app.infrastructure.models.user import User
+from app.infrastructure.services.crud import user as UserService
+from app.infrastructure.services.task_status import start_task_status_updates, stop_task_status_updates
+from benchmarks.common import summarize
+from benchmarks.ml_batch_throughput import FakeLlama
+from broker import envelope
+from broker.inprocess import InProcessTransport
+from broker.transport import set_transport
+from config.app_config import DB_QUEUE, TASK_EVENTS_EXCHANGE, TASK_QUEUE
+from database import database
+from database.pool import InstrumentedAsyncPool
+from worker.batching import MicroBatcher
+from worker.scheduling import FairScheduler
+from worker.db import db_worker
+from worker.ml import ml_worker, model_loader
+from worker.ml.executor import InferenceExecutor
+from worker.ml.result_cache import MemoryResultCache, NullResultCache
+
+
+OPERATIONS = ("predict", "history", "deposit")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}, expected one of {OPERATIONS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def task_ids(body: bytes) -> List[str]:
+    """Идентификаторы задач в сообщении любой из очередей конвейера."""
+    data = envelope.decode(body)
+    if "tasks" in data:
+        return [item["task_id"] for item in data["tasks"]]
+    return [data["task_id"]]
+
+
+class StageClock:
+    """Отметки времени по задачам: публикации из брокера, старты батчей из обработчиков."""
+
+    def __init__(self):
+        self.marks: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.timings: Dict[str, dict] = {}
+
+    def on_publish(self, exchange: str, routing_key: str, body: bytes, now: float) -> None:
+        if exchange == "" and routing_key == TASK_QUEUE:
+            mark = "task_published"
+        elif exchange == "" and routing_key == DB_QUEUE:
+            mark = "result_published"
+            data = envelope.decode(body)
+            if "timings" in data:
+                self.timings[data["task_id"]] = data["timings"]
+        elif exchange == TASK_EVENTS_EXCHANGE:
+            mark = "event_published"
+        else:
+            return
+        for task_id in task_ids(body):
+            self.marks[task_id].setdefault(mark, now)
+
+    def timed(self, handler, mark: str):
+        async def wrapper(messages):
+            now = time.perf_counter()
+            for message in messages:
+                try:
+                    for task_id in task_ids(message.body):
+                        self.marks[task_id].setdefault(mark, now)
+                except Exception:
+                    pass
+            await handler(messages)
+        return wrapper
+
+    def stages(self, task_id: str, submitted: float, accepted: float, finished: float) -> Dict[str, float]:
+        marks = self.marks.get(task_id, {})
+        points = [
+            ("submit_http", submitted, accepted),
+            ("task_queue", marks.get("task_published"), marks.get("ml_started")),
+            ("inference", marks.get("ml_started"), marks.get("result_published")),
+            ("db_queue", marks.get("result_published"), marks.get("db_started")),
+            ("db_write", marks.get("db_started"), marks.get("event_published")),
+            ("notify", marks.get("event_published"), finished),
+        ]
+        stages = {name: end - start for name, start, end in points if start is not None and end is not None}
+        timings = self.timings.get(task_id)
+        if timings:
+            stages["prefill"] = timings["prefill_s"]
+            stages["decode"] = timings["decode_s"]
+        return stages
+
+
+async def open_database(kind: str) -> Optional[str]:
+    """Поднимает engine процесса; для SQLite - во временном файле (путь возвращается)."""
+    if kind == "postgres":
+        await database.get_database_engine()
+        await database.init_db(drop_all=False)
+        return None
+
+    path = os.path.join(tempfile.mkdtemp(prefix="e2e-bench-"), "bench.sqlite3")
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        poolclass=InstrumentedAsyncPool,
+        pool_size=5,
+        max_overflow=5,
+        connect_args={"timeout": 30},
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    # get_database_engine в воркерах увидит готовый engine и не станет создавать свой
+    database.engine = engine
+    database.AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await database.init_db(drop_all=True)
+    return path
+
+
+async def create_users(count: int) -> List[int]:
+    ids = []
+    async with database.AsyncSessionLocal() as session:
+        for _ in range(count):
+            user = await UserService.create_user(User(
+                full_name="bench",
+                email=f"bench-{uuid.uuid4().hex[:12]}@example.com",
+                password="bench",
+                credits=1e9,
+                is_active=True,
+                is_superuser=False,
+            ), session)
+            ids.append(user.id)
+    return ids
+
+
+async def start_ml_worker(broker: InProcessTransport, clock: StageClock, args) -> List[asyncio.Task]:
+    fake = FakeLlama(args.prefill_ms, args.token_ms, args.tokens)
+    model_loader.create_llama = lambda path: fake
+    model_path = tempfile.NamedTemporaryFile(suffix=".gguf", delete=False).name
+    ml_worker.registry = SimpleNamespace(active=model_loader.ModelSpec("bench", model_path, "bench"))
+    ml_worker.executor = InferenceExecutor("thread", 1)
+    ml_worker.settings.ML_STREAM_TOKENS = args.stream_tokens
+    model_loader._result_cache = (
+        MemoryResultCache(max_items=1024) if args.result_cache == "memory" else NullResultCache()
+    )
+
+    batcher = MicroBatcher(
+        handler=clock.timed(ml_worker.on_message_ml_batch, "ml_started"),
+        max_batch_size=args.ml_batch_size,
+        max_wait_s=args.ml_batch_wait_ms / 1000,
+        max_concurrent_batches=ml_worker.executor.capacity,
+        name=TASK_QUEUE,
+        queue=FairScheduler(ml_worker.task_schedule_key),
+    )
+    prefetch = ml_worker.executor.capacity * args.ml_batch_size + ml_worker.settings.ML_SCHEDULER_WINDOW
+    await broker.consume(TASK_QUEUE, ml_worker.coalescing_submit(batcher), prefetch=prefetch)
+    return [asyncio.create_task(batcher.run())]
+
+
+async def start_db_worker(broker: InProcessTransport, clock: StageClock, args) -> List[asyncio.Task]:
+    batcher = MicroBatcher(
+        handler=clock.timed(db_worker.on_message_db_batch, "db_started"),
+        max_batch_size=args.db_batch_size,
+        max_wait_s=args.db_batch_wait_ms / 1000,
+        name=DB_QUEUE,
+    )
+    await broker.consume(DB_QUEUE, batcher.submit, prefetch=args.db_batch_size * 2)
+    return [asyncio.create_task(batcher.run())]
+
+
+async def run_clients(client: httpx.AsyncClient, clock: StageClock, users: List[int], args) -> dict:
+    rng = random.Random(args.seed)
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    plan = [rng.choices(names, weights)[0] for _ in range(args.requests)]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    end_to_end: List[float] = []
+    stages: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    position = iter(range(len(plan)))
+
+    async def predict(user_id: int, i: int):
+        submitted = time.perf_counter()
+        response = await client.post("/api/ml/predict", json={"user_id": user_id, "data": f"bench prompt {i}"})
+        accepted = time.perf_counter()
+        if response.status_code != 201:
+            errors["predict_submit"] += 1
+            return
+        task_id = response.json()["id"]
+        while True:
+            status = await client.get(f"/api/ml/tasks/{task_id}", params={"wait": args.result_timeout_s})
+            body = status.json()
+            if body.get("status") in ("completed", "failed") or time.perf_counter() - submitted > args.result_timeout_s:
+                break
+        finished = time.perf_counter()
+        if body.get("status") != "completed":
+            errors["predict_result"] += 1
+            return
+        latencies["predict"].append(accepted - submitted)
+        end_to_end.append(finished - submitted)
+        for stage, seconds in clock.stages(task_id, submitted, accepted, finished).items():
+            stages[stage].append(seconds)
+
+    async def history(user_id: int, i: int):
+        started = time.perf_counter()
+        response = await client.post(f"/api/ml/{user_id}/predictions", params={"limit": 50})
+        latencies["history"].append(time.perf_counter() - started)
+        if response.status_code not in (200, 404):
+            errors["history"] += 1
+
+    async def deposit(user_id: int, i: int):
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/transaction/deposit", params={"user_id": user_id}, json={"transaction_amount": 10}
+        )
+        latencies["deposit"].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors["deposit"] += 1
+
+    handlers = {"predict": predict, "history": history, "deposit": deposit}
+
+    async def worker(worker_rng: random.Random):
+        for i in position:
+            await handlers[plan[i]](worker_rng.choice(users), i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(args.seed + n)) for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_s": elapsed,
+        "throughput_rps": len(plan) / elapsed,
+        "operations": {name: {**summarize(values), "rps": len(values) / elapsed} for name, values in latencies.items()},
+        "end_to_end": summarize(end_to_end),
+        "stages": {name: summarize(values) for name, values in stages.items()},
+        "errors": dict(errors),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(report: dict) -> None:
+    print(f"throughput: {report['throughput_rps']:.1f} req/s over {report['elapsed_s']:.1f}s, errors={report['errors']}")
+    rows = [(f"op {name}", summary) for name, summary in report["operations"].items()]
+    rows.append(("submit->result", report["end_to_end"]))
+    rows.extend((f"  stage {name}", summary) for name, summary in report["stages"].items())
+    for name, summary in rows:
+        print(f"{name:<22} n={summary['count']:<6} p50={summary['p50_ms']:9.2f}ms "
+              f"p95={summary['p95_ms']:9.2f}ms p99={summary['p99_ms']:9.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("predict=0.7,history=0.2,deposit=0.1"))
+    parser.add_argument("--database", choices=("sqlite", "postgres"), default="sqlite",
+                        help="sqlite - временный файл; postgres - база из .env")
+    parser.add_argument("--prefill-ms", type=float, default=5.0)
+    parser.add_argument("--token-ms", type=float, default=1.0)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--result-cache", choices=("none", "memory"), default="none")
+    parser.add_argument("--stream-tokens", action="store_true", help="Публиковать токены (без подписчиков)")
+    parser.add_argument("--ml-batch-size", type=int, default=ml_worker.settings.ML_BATCH_SIZE)
+    parser.add_argument("--ml-batch-wait-ms", type=float, default=ml_worker.settings.ML_BATCH_MAX_WAIT_MS)
+    parser.add_argument("--db-batch-size", type=int, default=db_worker.settings.DB_WRITE_BATCH_SIZE)
+    parser.add_argument("--db-batch-wait-ms", type=float, default=db_worker.settings.DB_WRITE_MAX_WAIT_MS)
+    parser.add_argument("--result-timeout-s", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="e2e_latency.json")
+    args = parser.parse_args()
+
+    clock = StageClock()
+    broker = InProcessTransport(on_publish=clock.on_publish)
+    set_transport(broker)
+    # Кэш статусов API получает события завершения, как через fanout RabbitMQ
+    await start_task_status_updates()
+
+    await open_database(args.database)
+    users = await create_users(args.users)
+    workers = await start_ml_worker(broker, clock, args) + await start_db_worker(broker, clock, args)
+
+    app = create_application()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        report = await run_clients(client, clock, users, args)
+
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await stop_task_status_updates()
+    await broker.close()
+    ml_worker.executor.shutdown()
+    set_transport(None)
+    await database.disconnect_db()
+
+    report = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **report,
+    }
+    print_report(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
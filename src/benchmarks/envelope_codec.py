@@ -0,0 +1,101 @@
+"""
+Стоимость кодирования сообщений очередей: прежний JSON против конверта
+broker.envelope (msgpack, с порогом сжатия и без него).
+
+Для каждого вида сообщения печатаются размер тела и время encode/decode
+на сообщение. Брокер и база не нужны.
+
+Запуск (из каталога src):
+    python -m benchmarks.envelope_codec --iterations 20000
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+from broker import envelope
+
+
+WORDS = (
+    "модель ответ запрос данные пользователь задача результат очередь текст "
+    "model answer request data user task result queue text summary token "
+    "translate explain list write short long please the of and in to"
+).split()
+
+
+def text(rng: random.Random, chars: int) -> str:
+    words: List[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+def sample_messages(rng: random.Random) -> Dict[str, dict]:
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return {
+        "task, 60 chars": {"task_id": str(uuid.uuid4()), "data": text(rng, 60)},
+        "task, 8k chars": {"task_id": str(uuid.uuid4()), "data": text(rng, 8000)},
+        "result, 500 chars": {
+            "task_id": str(uuid.uuid4()), "status": "completed", "result": text(rng, 500),
+            "timings": {"prefill_s": 0.012, "decode_s": 1.53, "tokens": 128},
+        },
+        "result, 4k chars": {
+            "task_id": str(uuid.uuid4()), "status": "completed", "result": text(rng, 4000),
+            "timings": {"prefill_s": 0.012, "decode_s": 9.8, "tokens": 1024},
+        },
+        "token event": {"event": "token", "task_id": str(uuid.uuid4()), "text": " модель"},
+        "64 task events": {"tasks": [
+            {"task_id": str(uuid.uuid4()), "status": "completed", "result": text(rng, 200), "completed_at": now}
+            for _ in range(64)
+        ]},
+    }
+
+
+def legacy_encode(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=str).encode()
+
+
+def legacy_decode(body: bytes) -> dict:
+    return json.loads(body.decode())
+
+
+CODECS: List[Tuple[str, Callable[[dict], bytes], Callable[[bytes], dict]]] = [
+    ("json", legacy_encode, legacy_decode),
+    ("envelope", lambda payload: envelope.encode(payload, compress_min_bytes=0), envelope.decode),
+    (f"envelope+zlib>={envelope.COMPRESS_MIN_BYTES}", envelope.encode, envelope.decode),
+]
+
+
+def per_call_us(fn: Callable, arg, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    messages = sample_messages(random.Random(args.seed))
+    print(f"{'message':<20} {'codec':<24} {'bytes':>8} {'encode, us':>11} {'decode, us':>11}")
+    for name, payload in messages.items():
+        # Крупные сообщения гоняем реже, чтобы прогон занимал сопоставимое время
+        iterations = max(min(args.iterations, args.iterations * 200 // len(legacy_encode(payload))), 100)
+        for codec, encode, decode in CODECS:
+            body = encode(payload)
+            assert decode(body) == payload
+            print(f"{name:<20} {codec:<24} {len(body):>8} "
+                  f"{per_call_us(encode, payload, iterations):>11.2f} {per_call_us(decode, body, iterations):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Симуляция планирования задач ML: латентность легких пользователей, пока
+один тяжелый пользователь заливает очередь тысячами промптов.
+
+Модель в виртуальном времени: брокер (FIFO или приоритетная очередь),
+окно prefetch воркера и буфер перед инференсом (FIFO или FairScheduler),
+батч до --batch-size задач обрабатывается за --batch-s + --task-s на задачу.
+Тяжелый пользователь ставит --heavy-tasks задач в момент 0, легкие -
+по одной задаче в среднем раз в --light-interval-s (пуассоновский поток)
+в течение --duration-s.
+
+Варианты:
+    fifo             - брокер FIFO, буфер FIFO (как было)
+    drr              - брокер FIFO, FairScheduler в окне prefetch
+    drr + priority   - приоритетная очередь брокера и FairScheduler
+
+Запуск (из каталога src):
+    python -m benchmarks.fair_scheduling --heavy-tasks 10000 --light-users 20 --window 24
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import random
+from collections import deque
+from typing import Dict, List, NamedTuple
+
+from benchmarks.common import percentile
+from config.app_config import TASK_PRIORITY_BATCH, TASK_PRIORITY_INTERACTIVE
+from worker.scheduling import FairScheduler
+
+HEAVY_USER = 0
+
+
+class SimTask(NamedTuple):
+    submitted_at: float
+    user: int
+    priority: int
+
+
+class FifoBroker:
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, task: SimTask) -> None:
+        self._items.append(task)
+
+    def pop(self) -> SimTask:
+        return self._items.popleft()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class PriorityBroker(FifoBroker):
+    """Как x-max-priority: старший приоритет раньше, внутри приоритета - FIFO."""
+
+    def __init__(self):
+        super().__init__()
+        self._items = []
+        self._sequence = itertools.count()
+
+    def push(self, task: SimTask) -> None:
+        heapq.heappush(self._items, (-task.priority, next(self._sequence), task))
+
+    def pop(self) -> SimTask:
+        return heapq.heappop(self._items)[2]
+
+
+def make_arrivals(args, rng: random.Random) -> List[SimTask]:
+    heavy_priority = TASK_PRIORITY_BATCH if args.heavy_class == "batch" else TASK_PRIORITY_INTERACTIVE
+    arrivals = [SimTask(0.0, HEAVY_USER, heavy_priority) for _ in range(args.heavy_tasks)]
+    for user in range(1, args.light_users + 1):
+        t = rng.expovariate(1 / args.light_interval_s)
+        while t < args.duration_s:
+            arrivals.append(SimTask(t, user, TASK_PRIORITY_INTERACTIVE))
+            t += rng.expovariate(1 / args.light_interval_s)
+    arrivals.sort(key=lambda task: task.submitted_at)
+    return arrivals
+
+
+def simulate(arrivals: List[SimTask], broker: FifoBroker, buffer, args) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {"light": [], "heavy": []}
+    now = 0.0
+    next_arrival = 0
+    finished = 0
+    while finished < len(arrivals):
+        while next_arrival < len(arrivals) and arrivals[next_arrival].submitted_at <= now:
+            broker.push(arrivals[next_arrival])
+            next_arrival += 1
+        # Брокер досылает сообщения, пока в окне prefetch есть место
+        while len(broker) and buffer.qsize() < args.window:
+            buffer.put_nowait(broker.pop())
+        if buffer.empty():
+            now = arrivals[next_arrival].submitted_at
+            continue
+
+        batch = [buffer.get_nowait() for _ in range(min(args.batch_size, buffer.qsize()))]
+        now += args.batch_s + args.task_s * len(batch)
+        for task in batch:
+            latencies["heavy" if task.user == HEAVY_USER else "light"].append(now - task.submitted_at)
+        finished += len(batch)
+    return latencies
+
+
+def fifo_buffer():
+    return asyncio.Queue()
+
+
+def fair_buffer():
+    return FairScheduler(key=lambda task: (task.priority, task.user))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--heavy-tasks", type=int, default=10000)
+    parser.add_argument("--heavy-class", choices=("batch", "interactive"), default="batch",
+                        help="как тяжелый пользователь ставит задачи: /predict/batch или по одной")
+    parser.add_argument("--light-users", type=int, default=20)
+    parser.add_argument("--light-interval-s", type=float, default=60.0)
+    parser.add_argument("--duration-s", type=float, default=1800.0)
+    parser.add_argument("--window", type=int, default=24, help="prefetch реплики (task_prefetch)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batch-s", type=float, default=0.5)
+    parser.add_argument("--task-s", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    arrivals = make_arrivals(args, random.Random(args.seed))
+    variants = (
+        ("fifo", FifoBroker, fifo_buffer),
+        ("drr", FifoBroker, fair_buffer),
+        ("drr + priority", PriorityBroker, fair_buffer),
+    )
+    light_count = sum(1 for task in arrivals if task.user != HEAVY_USER)
+    print(f"heavy tasks: {args.heavy_tasks} ({args.heavy_class}), light tasks: {light_count}, window: {args.window}")
+    print(f"{'variant':<16} {'light p50, s':>12} {'p95, s':>9} {'p99, s':>9} {'max, s':>9} {'heavy done, s':>14}")
+    for name, broker_cls, buffer_factory in variants:
+        latencies = simulate(arrivals, broker_cls(), buffer_factory(), args)
+        light = latencies["light"]
+        heavy_done = max(latencies["heavy"], default=0.0)
+        print(f"{name:<16} {percentile(light, 50):>12.1f} {percentile(light, 95):>9.1f} "
+              f"{percentile(light, 99):>9.1f} {max(light, default=float('nan')):>9.1f} {heavy_done:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
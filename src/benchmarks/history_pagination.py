@@ -0,0 +1,123 @@
+"""
+Латентность страницы истории задач при росте таблицы: keyset-пагинация
+(первая и "глубокая" страница) против OFFSET и прежней выборки всей истории.
+
+Нужна локальная база из .env. Для каждого размера из --sizes история
+одного пользователя дозаполняется до этого размера, затем каждый вариант
+запроса повторяется --repeat раз.
+
+Запуск (из каталога src):
+    python -m benchmarks.history_pagination --sizes 1000 10000 100000 --limit 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+
+from app.infrastructure.models.prediction_task import PredictionTask
+from app.infrastructure.models.user import User
+from app.infrastructure.services.crud import user as UserService
+from app.infrastructure.services.crud.ml_service import get_prediction_task_history
+from app.infrastructure.services.crud.text_blob import store_texts
+from app.infrastructure.services.pagination import encode_cursor
+from benchmarks.common import format_row, summarize
+from database import database
+
+
+SEED_CHUNK = 5000
+
+
+async def seed_history(user_id: int, start: int, stop: int) -> None:
+    base = datetime.utcnow() - timedelta(days=365)
+    for chunk_start in range(start, stop, SEED_CHUNK):
+        async with database.AsyncSessionLocal() as session:
+            hashes = await store_texts(["bench"], session)
+            session.add_all([
+                # Часть задач с одинаковым created_at: порядок должен оставаться стабильным
+                PredictionTask(user_id=user_id, input_hash=hashes["bench"], cost=0.0,
+                               created_at=base + timedelta(seconds=i // 2))
+                for i in range(chunk_start, min(chunk_start + SEED_CHUNK, stop))
+            ])
+            await session.commit()
+
+
+async def timed(query, repeat: int) -> list[float]:
+    latencies = []
+    for _ in range(repeat):
+        async with database.AsyncSessionLocal() as session:
+            started = time.perf_counter()
+            await query(session)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def middle_cursor(user_id: int, offset: int) -> str:
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(PredictionTask.created_at, PredictionTask.id)
+            .where(PredictionTask.user_id == user_id)
+            .order_by(PredictionTask.created_at.desc(), PredictionTask.id.desc())
+            .offset(offset).limit(1)
+        )
+        return encode_cursor(*result.one())
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    await database.get_database_engine()
+    await database.init_db(drop_all=False)
+    async with database.AsyncSessionLocal() as session:
+        user = await UserService.create_user(User(
+            full_name="bench",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="bench",
+            is_active=True,
+            is_superuser=False,
+        ), session)
+
+    seeded = 0
+    for size in sorted(args.sizes):
+        await seed_history(user.id, seeded, size)
+        seeded = size
+        offset = size // 2
+        cursor = await middle_cursor(user.id, offset)
+
+        async def first_page(session):
+            page = await get_prediction_task_history(user.id, session, args.limit)
+            assert len(page.items) == args.limit
+
+        async def deep_page(session):
+            page = await get_prediction_task_history(user.id, session, args.limit, cursor)
+            assert len(page.items) == args.limit
+
+        async def offset_page(session):
+            await session.execute(
+                select(PredictionTask)
+                .where(PredictionTask.user_id == user.id)
+                .order_by(PredictionTask.created_at.desc(), PredictionTask.id.desc())
+                .offset(offset).limit(args.limit)
+            )
+
+        async def full_history(session):
+            result = await session.execute(select(PredictionTask).where(PredictionTask.user_id == user.id))
+            result.scalars().all()
+
+        print(f"--- rows={size}")
+        print(format_row("keyset first page", summarize(await timed(first_page, args.repeat))))
+        print(format_row("keyset deep page", summarize(await timed(deep_page, args.repeat))))
+        print(format_row("offset deep page", summarize(await timed(offset_page, args.repeat))))
+        print(format_row("full history", summarize(await timed(full_history, max(args.repeat // 10, 1)))))
+
+    await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Сериализация списков истории: прежний путь (ORM-объекты, проверка через
+response_model, стандартный json) против строк выборки через orjson.
+
+Варианты:
+    orm + json        - объекты с атрибутами (как ORM PredictionTask), response_model, JSONResponse
+    rows + orjson     - строки выборки, response_model, ORJSONResponse
+    rows direct       - строки выборки, RowsResponse без response_model
+
+Приложение с тремя роутами поднимается в процессе через httpx.ASGITransport,
+данные готовятся в памяти заранее, поэтому замеряется только путь ответа.
+
+Запуск (из каталога src):
+    python -m benchmarks.list_serialization --rows 1000 10000 100000 --repeat 5
+"""
+import argparse
+import asyncio
+import datetime
+import time
+import uuid
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.infrastructure.models.prediction_task import PredictionTaskPublic, TaskStatus
+from app.infrastructure.services.crud.ml_service import TASK_HISTORY_COLUMNS
+from app.infrastructure.services.pagination import Page
+from app.infrastructure.services.responses import page_response
+
+# Строка выборки: кортеж с именами полей, как sqlalchemy.Row
+TaskRow = namedtuple("TaskRow", [column.key for column in TASK_HISTORY_COLUMNS])
+
+
+def make_rows(count: int) -> List[TaskRow]:
+    started = datetime.datetime(2024, 1, 1)
+    return [
+        TaskRow(
+            id=uuid.uuid4(),
+            user_id=1,
+            input_data=f"bench prompt number {i}",
+            result_data=f"bench result for prompt {i} " * 4,
+            cost=1.0,
+            status=TaskStatus.COMPLETED,
+            created_at=started + datetime.timedelta(seconds=i),
+            completed_at=started + datetime.timedelta(seconds=i, milliseconds=750),
+        )
+        for i in range(count)
+    ]
+
+
+def create_bench_app(rows: List[TaskRow]) -> FastAPI:
+    # Тексты задачи теперь в text_blobs - прежние ORM-объекты изображаем объектами с атрибутами
+    tasks = [SimpleNamespace(**row._asdict()) for row in rows]
+    app = FastAPI()
+
+    @app.get("/orm", response_model=List[PredictionTaskPublic], response_class=JSONResponse)
+    async def orm():
+        return tasks
+
+    @app.get("/rows-validated", response_model=List[PredictionTaskPublic], response_class=ORJSONResponse)
+    async def rows_validated():
+        return rows
+
+    @app.get("/rows", response_model=List[PredictionTaskPublic])
+    async def rows_direct():
+        return page_response(Page(items=rows, next_cursor=None))
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(path)
+        best = min(best, time.perf_counter() - started)
+        response.raise_for_status()
+        size = len(response.content)
+    return best, size
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    variants = (("orm + json", "/orm"), ("rows + orjson", "/rows-validated"), ("rows direct", "/rows"))
+    print(f"{'rows':>7} {'variant':<16} {'best, ms':>10} {'us/row':>8} {'bytes':>11}")
+    for count in args.rows:
+        rows = make_rows(count)
+        transport = httpx.ASGITransport(app=create_bench_app(rows))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            bodies = {}
+            for name, path in variants:
+                elapsed, size = await measure(client, path, args.repeat)
+                bodies[name] = (await client.get(path)).json()
+                print(f"{count:>7} {name:<16} {elapsed * 1000:>10.1f} {elapsed / count * 1e6:>8.2f} {size:>11}")
+            # Быстрый путь обязан отдавать то же, что и проверка через response_model
+            assert bodies["rows direct"] == bodies["orm + json"]
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Шквал логинов: пропускная способность POST /api/users/signin и латентность
+других эндпоинтов (GET /health) во время него.
+
+Сравниваются проверка bcrypt прямо в event loop (прежний путь) и пул
+password_hasher. Приложение поднимается в процессе через httpx.ASGITransport,
+нужна локальная база из .env.
+
+Запуск (из каталога src):
+    python -m benchmarks.login_storm --signins 400 --concurrency 64 --rounds 12
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from app.api import create_application
+from app.infrastructure.auth import hash_password
+from app.infrastructure.models.user import User
+from app.infrastructure.routes import user as user_routes
+from app.infrastructure.services.crud import user as UserService
+from benchmarks.common import format_row, summarize
+from database import database
+
+
+PASSWORD = "bench-password"
+
+
+class InlineHasher:
+    """Прежний путь: bcrypt прямо в event loop."""
+
+    async def hash(self, password: str) -> str:
+        return hash_password.get_password_hash(password)
+
+    async def verify(self, plain_password: str, stored_password: str) -> bool:
+        return hash_password.verify_password(plain_password, stored_password)
+
+
+async def create_bench_user(password_hash: str) -> str:
+    async with database.AsyncSessionLocal() as session:
+        user = await UserService.create_user(User(
+            full_name="bench",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password=password_hash,
+            is_active=True,
+            is_superuser=False,
+        ), session)
+        return user.email
+
+
+async def storm(client: httpx.AsyncClient, email: str, signins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    codes: dict[int, int] = {}
+    probes: list[float] = []
+    done = asyncio.Event()
+
+    async def signin():
+        async with semaphore:
+            response = await client.post("/api/users/signin", json={"email": email, "password": PASSWORD})
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/health")
+            probes.append(time.perf_counter() - started)
+            await asyncio.sleep(0.01)
+
+    prober = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(signin() for _ in range(signins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    return elapsed, codes, probes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=hash_password.settings.PASSWORD_BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    hash_password.pwd_context.update(bcrypt__rounds=args.rounds)
+    await database.get_database_engine()
+    await database.init_db(drop_all=False)
+    email = await create_bench_user(hash_password.get_password_hash(PASSWORD))
+
+    pooled = hash_password.password_hasher
+    app = create_application()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, hasher in (("inline bcrypt", InlineHasher()), ("hasher pool", pooled)):
+            user_routes.password_hasher = hasher
+            elapsed, codes, probes = await storm(client, email, args.signins, args.concurrency)
+            print(f"{name:<14} {codes.get(200, 0) / elapsed:8.1f} logins/s  codes={codes}")
+            print(format_row(f"  /health during {name}", summarize(probes)))
+
+    pooled.shutdown()
+    await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
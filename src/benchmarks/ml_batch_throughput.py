@@ -0,0 +1,126 @@
+"""
+Бенчмарк накладных расходов ML воркера на задачу при разных размерах батча.
+
+Моделирует глубокий бэклог коротких промптов: все сообщения уже лежат в
+буфере батчера, публикация результата заменена задержкой --publish-ms.
+Без --model-path используется FakeLlama с задержкой на токен.
+
+Промпты батча декодируются по очереди (generate_responses), поэтому
+скорость декодирования от размера батча не зависит: разница в tasks/s -
+это только повторные промпты и накладные расходы на сообщение.
+
+Запуск (из каталога src):
+    python -m benchmarks.ml_batch_throughput --tasks 256 --batch-sizes 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from broker import envelope
+from worker.ml import ml_worker, model_loader
+from worker.batching import MicroBatcher
+from worker.ml.executor import InferenceExecutor
+from worker.ml.result_cache import MemoryResultCache
+
+
+class FakeLlama:
+    """Заглушка Llama: фиксированная стоимость префилла и задержка на токен."""
+
+    def __init__(self, prefill_ms: float, token_ms: float, tokens: int):
+        self.prefill_s = prefill_ms / 1000
+        self.token_s = token_ms / 1000
+        self.tokens = tokens
+
+    def create_chat_completion(self, messages, max_tokens=128, stream=False, **kwargs):
+        n = min(self.tokens, max_tokens)
+        if not stream:
+            time.sleep(self.prefill_s + self.token_s * n)
+            return {"choices": [{"message": {"content": "tok " * n}}], "usage": {"completion_tokens": n}}
+        return self._stream(n)
+
+    def _stream(self, n: int):
+        time.sleep(self.prefill_s)
+        yield {"choices": [{"delta": {"role": "assistant"}}]}
+        for _ in range(n):
+            time.sleep(self.token_s)
+            yield {"choices": [{"delta": {"content": "tok "}}]}
+
+
+class FakeMessage:
+    def __init__(self, body: bytes, done: asyncio.Queue):
+        self.body = body
+        self._done = done
+
+    async def ack(self):
+        await self._done.put(True)
+
+    async def nack(self, requeue: bool = True):
+        await self._done.put(False)
+
+    async def reject(self, requeue: bool = False):
+        await self._done.put(False)
+
+
+async def run_once(batch_size: int, tasks: int, unique_prompts: int, publish_ms: float) -> float:
+    async def fake_publish(queue_name, payload):
+        await asyncio.sleep(publish_ms / 1000)
+
+    async def fake_publish_event(task_id, event, **payload):
+        pass
+
+    ml_worker.publish_result = fake_publish
+    ml_worker.publish_stream_event = fake_publish_event
+    ml_worker.settings.ML_STREAM_TOKENS = False
+    ml_worker.executor = InferenceExecutor("thread", 1)
+    model_loader._result_cache = MemoryResultCache(max_items=128)
+
+    done: asyncio.Queue = asyncio.Queue()
+    batcher = MicroBatcher(ml_worker.on_message_ml_batch, max_batch_size=batch_size, max_wait_s=0.005)
+    prompts = [f"Short prompt #{random.randrange(unique_prompts)}" for _ in range(tasks)]
+
+    for i, prompt in enumerate(prompts):
+        body = envelope.encode({"task_id": str(i), "data": prompt})
+        await batcher.submit(FakeMessage(body, done))
+
+    started = time.perf_counter()
+    runner = asyncio.create_task(batcher.run())
+    for _ in range(tasks):
+        await done.get()
+    elapsed = time.perf_counter() - started
+    runner.cancel()
+    ml_worker.executor.shutdown()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--unique-prompts", type=int, default=64)
+    parser.add_argument("--publish-ms", type=float, default=1.0)
+    parser.add_argument("--model-path", default=None, help="GGUF файл для замера на реальной модели")
+    parser.add_argument("--prefill-ms", type=float, default=5.0)
+    parser.add_argument("--token-ms", type=float, default=0.5)
+    parser.add_argument("--tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.model_path:
+        model_path = args.model_path
+    else:
+        fake = FakeLlama(args.prefill_ms, args.token_ms, args.tokens)
+        model_loader.create_llama = lambda path: fake
+        model_path = tempfile.NamedTemporaryFile(suffix=".gguf", delete=False).name
+    ml_worker.registry = SimpleNamespace(active=model_loader.ModelSpec("bench", model_path, "bench"))
+
+    print(f"{'batch':>6} {'tasks/s':>10} {'elapsed, s':>11}")
+    for batch_size in args.batch_sizes:
+        random.seed(0)
+        elapsed = await run_once(batch_size, args.tasks, args.unique_prompts, args.publish_ms)
+        print(f"{batch_size:>6} {args.tasks / elapsed:>10.1f} {elapsed:>11.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
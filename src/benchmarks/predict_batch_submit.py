@@ -0,0 +1,75 @@
+"""
+Накладные расходы постановки промптов: POST /api/ml/predict на каждый
+промпт против POST /api/ml/predict/batch пачками.
+
+Приложение поднимается в процессе через httpx.ASGITransport, база и
+RabbitMQ берутся из .env. Для прогона создается пользователь с большим
+балансом.
+
+Запуск (из каталога src):
+    python -m benchmarks.predict_batch_submit --prompts 5000 --batch-size 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.api import create_application
+from benchmarks.predict_publish_latency import create_bench_user
+from broker.transport import open_transport, close_transport
+from database import database
+
+
+async def per_prompt(client: httpx.AsyncClient, user_id: int, prompts: list[str], concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(prompt: str):
+        async with semaphore:
+            response = await client.post("/api/ml/predict", json={"user_id": user_id, "data": prompt})
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(prompt) for prompt in prompts))
+    return time.perf_counter() - started
+
+
+async def batched(client: httpx.AsyncClient, user_id: int, prompts: list[str], batch_size: int) -> float:
+    started = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        chunk = prompts[i:i + batch_size]
+        response = await client.post("/api/ml/predict/batch", json={"user_id": user_id, "data": chunk})
+        response.raise_for_status()
+        assert len(response.json()) == len(chunk)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    await database.get_database_engine()
+    await database.init_db(drop_all=False)
+    await open_transport()
+    user_id = await create_bench_user()
+    prompts = [f"bench prompt {i}" for i in range(args.prompts)]
+
+    app = create_application()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single = await per_prompt(client, user_id, prompts, args.concurrency)
+        batch = await batched(client, user_id, prompts, args.batch_size)
+
+    for name, elapsed in (("per prompt", single), (f"batch of {args.batch_size}", batch)):
+        print(f"{name:<16} {args.prompts / elapsed:10.1f} prompts/s "
+              f"{elapsed / args.prompts * 1e6:10.1f} us/prompt")
+
+    await close_transport()
+    await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
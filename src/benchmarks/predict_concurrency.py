@@ -0,0 +1,147 @@
+"""
+Параллельные POST /api/ml/predict одного пользователя: пропускная
+способность и корректность списаний.
+
+Пользователю начисляется ровно --affordable * PREDICTION_COST кредитов и
+отправляется --requests запросов с параллелизмом --concurrency. Корректный
+результат: ровно --affordable ответов 201, остальные 400, баланс 0, число
+задач и транзакций списания равно числу успешных ответов.
+
+Сравниваются прежний путь (SELECT, проверка и изменение в Python, два
+коммита) и условный UPDATE ... RETURNING в одной транзакции. Публикация
+в брокер заменена заглушкой, замеряется только работа с БД. Нужна
+локальная база из .env.
+
+Запуск (из каталога src):
+    python -m benchmarks.predict_concurrency --requests 400 --affordable 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+from sqlalchemy import func
+from sqlmodel import select
+
+from app.api import create_application
+from app.infrastructure.models.prediction_task import PredictionTask, TaskStatus
+from app.infrastructure.models.transaction import UserTransaction, TransactionType
+from app.infrastructure.models.user import User
+from app.infrastructure.routes import ml_routes
+from app.infrastructure.services.crud import ml_service
+from app.infrastructure.services.crud.text_blob import store_texts
+from app.infrastructure.services.crud import user as UserService
+from broker.transport import set_transport
+from database import database
+
+
+class NullPublisher:
+    async def publish(self, routing_key: str, body: bytes, **kwargs) -> None:
+        pass
+
+
+async def legacy_submit_prediction_task(user_id: int, input_data: str, session) -> PredictionTask:
+    """Прежний путь: чтение баланса, проверка в Python, коммит списания, затем коммит задачи."""
+    result = await session.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is None or user.credits < ml_service.PREDICTION_COST:
+        raise ml_routes.HTTPException(status_code=400, detail="Insufficient funds")
+    user.credits -= ml_service.PREDICTION_COST
+    session.add(user)
+    session.add(UserTransaction(
+        transaction_amount=ml_service.PREDICTION_COST,
+        type=TransactionType.EXPENSE,
+        user_id=user_id
+    ))
+    await session.commit()
+
+    hashes = await store_texts([input_data], session)
+    task = PredictionTask(user_id=user_id, input_hash=hashes[input_data],
+                          cost=ml_service.PREDICTION_COST, status=TaskStatus.PENDING)
+    session.add(task)
+    await session.commit()
+    await session.refresh(task)
+    return task
+
+
+async def create_bench_user(credits: float) -> int:
+    async with database.AsyncSessionLocal() as session:
+        user = await UserService.create_user(User(
+            full_name="bench",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="bench",
+            credits=credits,
+            is_active=True,
+            is_superuser=False,
+        ), session)
+        return user.id
+
+
+async def check_state(user_id: int) -> dict:
+    async with database.AsyncSessionLocal() as session:
+        credits = (await session.execute(select(User.credits).where(User.id == user_id))).scalar_one()
+        tasks = (await session.execute(
+            select(func.count()).select_from(PredictionTask).where(PredictionTask.user_id == user_id)
+        )).scalar_one()
+        debits = (await session.execute(
+            select(func.count()).select_from(UserTransaction).where(UserTransaction.user_id == user_id)
+        )).scalar_one()
+    return {"credits": credits, "tasks": tasks, "debits": debits}
+
+
+async def run(client: httpx.AsyncClient, user_id: int, requests: int, concurrency: int) -> tuple[float, dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+    codes: dict[int, int] = {}
+
+    async def one(i: int):
+        async with semaphore:
+            response = await client.post("/api/ml/predict", json={"user_id": user_id, "data": f"bench {i}"})
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - started, codes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--affordable", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    await database.get_database_engine()
+    await database.init_db(drop_all=False)
+    set_transport(NullPublisher())
+
+    app = create_application()
+    transport = httpx.ASGITransport(app=app)
+    variants = [
+        ("read-modify-write", legacy_submit_prediction_task),
+        ("conditional update", ml_service.submit_prediction_task),
+    ]
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, submit in variants:
+            ml_routes.submit_prediction_task = submit
+            user_id = await create_bench_user(args.affordable * ml_service.PREDICTION_COST)
+            elapsed, codes = await run(client, user_id, args.requests, args.concurrency)
+            state = await check_state(user_id)
+
+            accepted = codes.get(201, 0)
+            correct = (
+                accepted == args.affordable
+                and state["credits"] == 0
+                and state["tasks"] == accepted
+                and state["debits"] == accepted
+            )
+            print(f"{name:<20} {args.requests / elapsed:8.1f} req/s  codes={codes}  "
+                  f"credits={state['credits']} tasks={state['tasks']} debits={state['debits']}  "
+                  f"{'OK' if correct else 'INCONSISTENT'}")
+
+    set_transport(None)
+    await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Латентность POST /api/ml/predict: публикация через новое соединение на
+каждое сообщение (старый путь) против общего пула каналов.
+
+Приложение поднимается в процессе через httpx.ASGITransport, база и
+RabbitMQ берутся из .env. Для прогона создается пользователь с большим
+балансом.
+
+Запуск (из каталога src):
+    python -m benchmarks.predict_publish_latency --requests 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+from aio_pika import connect_robust, Message, DeliveryMode
+
+from app.api import create_application
+from app.infrastructure.models.user import User
+from app.infrastructure.services.crud import user as UserService
+from benchmarks.common import summarize, format_row
+from broker.transport import open_transport, close_transport, set_transport
+from config.app_config import Settings
+from database import database
+
+
+class ConnectPerMessagePublisher:
+    """Старый путь: connect_robust + новый канал на каждое сообщение."""
+
+    def __init__(self, url: str):
+        self._url = url
+
+    async def publish(self, routing_key: str, body: bytes, **kwargs) -> None:
+        connection = await connect_robust(self._url)
+        async with connection:
+            channel = await connection.channel()
+            await channel.default_exchange.publish(
+                Message(body=body, delivery_mode=DeliveryMode.PERSISTENT),
+                routing_key=routing_key
+            )
+
+
+async def create_bench_user() -> int:
+    async with database.AsyncSessionLocal() as session:
+        user = User(
+            full_name="bench",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="bench",
+            credits=1e9,
+            is_active=True,
+            is_superuser=False,
+        )
+        user = await UserService.create_user(user, session)
+        return user.id
+
+
+async def run(client: httpx.AsyncClient, user_id: int, requests: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/ml/predict", json={"user_id": user_id, "data": f"bench {i}"})
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    await database.get_database_engine()
+    await database.init_db(drop_all=False)
+    user_id = await create_bench_user()
+
+    app = create_application()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        set_transport(ConnectPerMessagePublisher(Settings().RABBITMQ_URL))
+        old = await run(client, user_id, args.requests, args.concurrency)
+
+        set_transport(None)
+        await open_transport("amqp")
+        new = await run(client, user_id, args.requests, args.concurrency)
+        await close_transport()
+
+    print(format_row("connect per message", summarize(old)))
+    print(format_row("pooled publisher", summarize(new)))
+    await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
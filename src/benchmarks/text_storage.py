@@ -0,0 +1,293 @@
+"""
+Хранение текстов задач: прежняя схема (input_data и result_data в каждой
+строке задачи) против text_blobs с ключом sha256 и ссылками из задачи.
+
+Синтетический набор с повторами, как в реальной нагрузке: промпты берутся
+из --distinct шаблонов по закону Ципфа (--zipf), доля --unique промптов
+уникальна; ответ на повторный промпт совпадает (детерминированная генерация
+и кэш результатов), --failed задач без результата. Обе схемы заполняются
+одними и теми же задачами.
+
+Отчет: размер таблиц вместе с TOAST и индексами и время выборок
+    page     - страница истории пользователя (50 задач с текстами)
+    results  - страница истории результатов (только текст результата)
+    export   - вся история пользователя с текстами
+    scan     - проход по всем задачам без текстов (сводка по статусам)
+
+Таблицы повторяют prediction_tasks до и после переноса текстов, выборки -
+запросы ml_service. По умолчанию SQLite во временных файлах (размер -
+файл базы); --database postgres - база из .env, таблицы bench_* создаются
+и удаляются, размер - pg_total_relation_size.
+
+Запуск (из каталога src):
+    python -m benchmarks.text_storage --rows 200000 --users 200 --distinct 5000 --unique 0.3
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, Text, Uuid,
+    func, insert, select, text,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from benchmarks.common import percentile
+from database import database
+
+
+PAGE_ROWS = 50
+INSERT_CHUNK = 5000
+
+metadata = MetaData()
+
+
+def _task_columns() -> List[Column]:
+    return [
+        Column("id", Uuid, primary_key=True),
+        Column("user_id", Integer, nullable=False),
+        Column("cost", Float, nullable=False),
+        Column("status", String, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Column("completed_at", DateTime),
+    ]
+
+
+inline_tasks = Table(
+    "bench_tasks_inline", metadata,
+    *_task_columns(),
+    Column("input_data", Text, nullable=False),
+    Column("result_data", Text),
+    Index("ix_bench_tasks_inline_user", "user_id", "created_at", "id"),
+)
+text_blobs = Table(
+    "bench_text_blobs", metadata,
+    Column("hash", LargeBinary, primary_key=True),
+    Column("body", Text, nullable=False),
+)
+blob_tasks = Table(
+    "bench_tasks_blobs", metadata,
+    *_task_columns(),
+    Column("input_hash", LargeBinary, ForeignKey("bench_text_blobs.hash"), nullable=False),
+    Column("result_hash", LargeBinary, ForeignKey("bench_text_blobs.hash")),
+    Index("ix_bench_tasks_blobs_user", "user_id", "created_at", "id"),
+)
+
+LAYOUTS = {"inline": [inline_tasks], "text_blobs": [blob_tasks, text_blobs]}
+
+
+class TextFactory:
+    """Тексты из словаря псевдослов: сжимаются примерно как естественный язык."""
+
+    def __init__(self, rng: random.Random, vocabulary: int = 3000):
+        letters = "абвгдежзиклмнопрстуфхцчшэюя"
+        self._words = ["".join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(vocabulary)]
+
+    def make(self, rng: random.Random, min_chars: int, max_chars: int) -> str:
+        size = rng.randint(min_chars, max_chars)
+        words = []
+        length = 0
+        while length < size:
+            word = rng.choice(self._words)
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)
+
+
+def make_dataset(args) -> List[dict]:
+    rng = random.Random(args.seed)
+    factory = TextFactory(rng)
+    templates = [factory.make(rng, args.prompt_chars[0], args.prompt_chars[1]) for _ in range(args.distinct)]
+    weights = [1 / rank ** args.zipf for rank in range(1, args.distinct + 1)]
+    results: Dict[str, str] = {}
+
+    def result_for(prompt: str) -> str:
+        result = results.get(prompt)
+        if result is None:
+            # Ответ определяется промптом: одинаковые промпты дают одинаковые ответы
+            result_rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+            result = results[prompt] = factory.make(result_rng, args.result_chars[0], args.result_chars[1])
+        return result
+
+    base = datetime(2024, 1, 1)
+    tasks = []
+    for i in range(args.rows):
+        if rng.random() < args.unique:
+            prompt = factory.make(rng, args.prompt_chars[0], args.prompt_chars[1])
+        else:
+            prompt = rng.choices(templates, weights)[0]
+        failed = rng.random() < args.failed
+        created_at = base + timedelta(seconds=i)
+        tasks.append({
+            "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+            "user_id": rng.randrange(args.users),
+            "cost": 5.0,
+            "status": "failed" if failed else "completed",
+            "created_at": created_at,
+            "completed_at": created_at + timedelta(seconds=1),
+            "input_data": prompt,
+            "result_data": None if failed else result_for(prompt),
+        })
+    return tasks
+
+
+async def load(inline_engine: AsyncEngine, blobs_engine: AsyncEngine, tasks: List[dict]) -> None:
+    blobs: Dict[bytes, str] = {}
+    inline_rows = []
+    blob_rows = []
+    for task in tasks:
+        row = {key: value for key, value in task.items() if key not in ("input_data", "result_data")}
+        inline_rows.append(dict(row, input_data=task["input_data"], result_data=task["result_data"]))
+        input_hash = hashlib.sha256(task["input_data"].encode("utf-8")).digest()
+        blobs[input_hash] = task["input_data"]
+        result_hash = None
+        if task["result_data"] is not None:
+            result_hash = hashlib.sha256(task["result_data"].encode("utf-8")).digest()
+            blobs[result_hash] = task["result_data"]
+        blob_rows.append(dict(row, input_hash=input_hash, result_hash=result_hash))
+
+    blob_list = [{"hash": key, "body": body} for key, body in blobs.items()]
+    for engine, batches in (
+            (inline_engine, ((inline_tasks, inline_rows),)),
+            (blobs_engine, ((text_blobs, blob_list), (blob_tasks, blob_rows))),
+    ):
+        async with engine.begin() as conn:
+            for table, rows in batches:
+                for start in range(0, len(rows), INSERT_CHUNK):
+                    await conn.execute(insert(table), rows[start:start + INSERT_CHUNK])
+    distinct_bytes = sum(len(body.encode("utf-8")) for body in blobs.values())
+    inline_bytes = sum(
+        len(task["input_data"].encode("utf-8")) + len((task["result_data"] or "").encode("utf-8")) for task in tasks
+    )
+    print(f"tasks: {len(tasks)}, distinct texts: {len(blobs)} "
+          f"({distinct_bytes / 2 ** 20:.1f} MiB of {inline_bytes / 2 ** 20:.1f} MiB inline)")
+
+
+def history_statement(layout: str, user_id: int, with_input: bool = True):
+    if layout == "inline":
+        tasks = inline_tasks
+        columns = [tasks.c.id, tasks.c.status, tasks.c.result_data, tasks.c.created_at, tasks.c.completed_at]
+        if with_input:
+            columns[1:1] = [tasks.c.user_id, tasks.c.input_data, tasks.c.cost]
+        statement = select(*columns)
+    else:
+        tasks = blob_tasks
+        input_text = text_blobs.alias("input_text")
+        result_text = text_blobs.alias("result_text")
+        columns = [tasks.c.id, tasks.c.status, result_text.c.body.label("result_data"),
+                   tasks.c.created_at, tasks.c.completed_at]
+        joined = tasks.outerjoin(result_text, result_text.c.hash == tasks.c.result_hash)
+        if with_input:
+            columns[1:1] = [tasks.c.user_id, input_text.c.body.label("input_data"), tasks.c.cost]
+            joined = joined.join(input_text, input_text.c.hash == tasks.c.input_hash)
+        statement = select(*columns).select_from(joined)
+    return (
+        statement
+        .where(tasks.c.user_id == user_id)
+        .order_by(tasks.c.created_at.desc(), tasks.c.id.desc())
+    )
+
+
+def scan_statement(layout: str):
+    tasks = inline_tasks if layout == "inline" else blob_tasks
+    return select(tasks.c.status, func.count(), func.sum(tasks.c.cost)).group_by(tasks.c.status)
+
+
+async def table_bytes(engine: AsyncEngine, layout: str, sqlite_path: Optional[str]) -> int:
+    if sqlite_path is not None:
+        # Каждая схема в SQLite живет в своем файле
+        return os.path.getsize(sqlite_path)
+    async with engine.connect() as conn:
+        total = 0
+        for table in LAYOUTS[layout]:
+            total += (await conn.execute(text(f"SELECT pg_total_relation_size('{table.name}')"))).scalar_one()
+        return total
+
+
+async def timed(engine: AsyncEngine, statement, repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        async with engine.connect() as conn:
+            started = time.perf_counter()
+            result = await conn.execute(statement)
+            result.all()
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def open_engines(kind: str) -> Dict[str, tuple]:
+    """Engine и путь файла SQLite (или None) для каждой схемы."""
+    if kind == "postgres":
+        engine = await database.get_database_engine()
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+            await conn.run_sync(metadata.create_all)
+        return {layout: (engine, None) for layout in LAYOUTS}
+
+    directory = tempfile.mkdtemp(prefix="text-storage-bench-")
+    engines = {}
+    for layout, tables in LAYOUTS.items():
+        path = os.path.join(directory, f"{layout}.sqlite3")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all, tables=tables)
+        engines[layout] = (engine, path)
+    return engines
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=5000, help="число повторяющихся шаблонов промптов")
+    parser.add_argument("--zipf", type=float, default=1.1, help="показатель распределения популярности шаблонов")
+    parser.add_argument("--unique", type=float, default=0.3, help="доля уникальных промптов")
+    parser.add_argument("--failed", type=float, default=0.02, help="доля задач без результата")
+    parser.add_argument("--prompt-chars", type=int, nargs=2, default=[80, 1200])
+    parser.add_argument("--result-chars", type=int, nargs=2, default=[200, 4000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tasks = make_dataset(args)
+    engines = await open_engines(args.database)
+    await load(engines["inline"][0], engines["text_blobs"][0], tasks)
+
+    user_id = max(range(args.users), key=lambda user: sum(1 for task in tasks if task["user_id"] == user))
+    print(f"{'layout':<11} {'size, MiB':>10} {'query':<8} {'p50, ms':>9} {'p95, ms':>9}")
+    try:
+        for layout, (engine, path) in engines.items():
+            async with engine.begin() as conn:
+                await conn.execute(text("ANALYZE"))
+            size = await table_bytes(engine, layout, path)
+            queries = (
+                ("page", history_statement(layout, user_id).limit(PAGE_ROWS), args.repeat),
+                ("results", history_statement(layout, user_id, with_input=False).limit(PAGE_ROWS), args.repeat),
+                ("export", history_statement(layout, user_id), max(args.repeat // 4, 1)),
+                ("scan", scan_statement(layout), max(args.repeat // 4, 1)),
+            )
+            for name, statement, repeat in queries:
+                latencies = await timed(engine, statement, repeat)
+                print(f"{layout:<11} {size / 2 ** 20:>10.1f} {name:<8} "
+                      f"{percentile(latencies, 50) * 1000:>9.2f} {percentile(latencies, 95) * 1000:>9.2f}")
+    finally:
+        if args.database == "postgres":
+            engine = engines["inline"][0]
+            async with engine.begin() as conn:
+                await conn.run_sync(metadata.drop_all)
+            await database.disconnect_db()
+        else:
+            for engine, _ in engines.values():
+                await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+from aio_pika import connect_robust, ExchangeType, IncomingMessage, Message, DeliveryMode
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.pool import Pool
+
+from broker.transport import EXCHANGES, QUEUE_ARGUMENTS, WORK_QUEUES, EventCallback, MessageCallback, Subscription, Transport
+
+logger = logging.getLogger(__name__)
+
+
+class _ChannelSubscription(Subscription):
+    """Подписка на exchange через эксклюзивную очередь на своем канале."""
+
+    def __init__(self, channel: AbstractChannel):
+        self._channel = channel
+
+    async def close(self) -> None:
+        if not self._channel.is_closed:
+            await self._channel.close()
+
+
+class AMQPTransport(Transport):
+    """
+    Транспорт через RabbitMQ: одно robust-соединение и пул каналов.
+
+    Соединение открывается один раз при старте процесса и переживает
+    переподключения брокера, поэтому публикация сообщения больше не
+    требует TCP+AMQP рукопожатия. Потребители очередей получают каждый
+    свой канал со своим prefetch.
+    """
+
+    def __init__(self, url: str, pool_size: int = 8, publisher_confirms: bool = True):
+        self._url = url
+        self._pool_size = pool_size
+        self._publisher_confirms = publisher_confirms
+        self._connection: Optional[AbstractRobustConnection] = None
+        self._channels: Optional[Pool] = None
+        self._consumer_channels: List[AbstractChannel] = []
+
+    @property
+    def connection(self) -> AbstractRobustConnection:
+        if self._connection is None:
+            raise RuntimeError("Transport is not opened")
+        return self._connection
+
+    async def open(self) -> None:
+        self._connection = await connect_robust(self._url)
+        self._channels = Pool(self._create_channel, max_size=self._pool_size)
+        # Топология объявляется один раз здесь, а не каждым потребителем
+        channel = await self._connection.channel()
+        try:
+            for name, exchange_type in EXCHANGES.items():
+                await channel.declare_exchange(name, ExchangeType(exchange_type), durable=True)
+            for name in WORK_QUEUES:
+                await channel.declare_queue(name, durable=True, arguments=QUEUE_ARGUMENTS.get(name))
+        finally:
+            await channel.close()
+
+    async def _create_channel(self) -> AbstractChannel:
+        return await self.connection.channel(publisher_confirms=self._publisher_confirms)
+
+    async def _publish(
+            self,
+            channel: AbstractChannel,
+            routing_key: str,
+            body: bytes,
+            exchange: str,
+            persistent: bool,
+            headers: Optional[dict],
+            priority: int
+    ) -> None:
+        if channel.is_closed:
+            await channel.reopen()
+        target = channel.default_exchange if not exchange else await channel.get_exchange(exchange, ensure=False)
+        await target.publish(
+            Message(
+                body=body,
+                headers=headers,
+                priority=priority or None,
+                delivery_mode=DeliveryMode.PERSISTENT if persistent else DeliveryMode.NOT_PERSISTENT
+            ),
+            routing_key=routing_key
+        )
+
+    async def publish(
+            self,
+            routing_key: str,
+            body: bytes,
+            *,
+            exchange: str = "",
+            persistent: bool = True,
+            headers: Optional[dict] = None,
+            priority: int = 0
+    ) -> None:
+        """Публикует одно сообщение через канал из пула."""
+        if self._channels is None:
+            raise RuntimeError("Transport is not opened")
+        async with self._channels.acquire() as channel:
+            await self._publish(channel, routing_key, body, exchange, persistent, headers, priority)
+
+    async def publish_many(
+            self,
+            routing_key: str,
+            bodies: Iterable[bytes],
+            *,
+            exchange: str = "",
+            persistent: bool = True,
+            priority: int = 0
+    ) -> None:
+        """Публикует пачку сообщений на одном канале, подтверждения ждем разом."""
+        if self._channels is None:
+            raise RuntimeError("Transport is not opened")
+        async with self._channels.acquire() as channel:
+            await asyncio.gather(*(
+                self._publish(channel, routing_key, body, exchange, persistent, None, priority)
+                for body in bodies
+            ))
+
+    async def consume(self, queue_name: str, callback: MessageCallback, *, prefetch: int) -> None:
+        channel = await self.connection.channel()
+        await channel.set_qos(prefetch_count=prefetch)
+        queue = await channel.declare_queue(queue_name, durable=True, arguments=QUEUE_ARGUMENTS.get(queue_name))
+        await queue.consume(callback)
+        self._consumer_channels.append(channel)
+        logger.info(f"Consuming {queue_name} with prefetch {prefetch}")
+
+    async def subscribe(
+            self,
+            exchange: str,
+            callback: EventCallback,
+            *,
+            routing_key: Optional[str] = None
+    ) -> Subscription:
+        channel = await self.connection.channel()
+        target = await channel.get_exchange(exchange, ensure=False)
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(target, routing_key=routing_key)
+
+        async def on_message(message: IncomingMessage) -> None:
+            await callback(message.body)
+
+        await queue.consume(on_message, no_ack=True)
+        return _ChannelSubscription(channel)
+
+    async def close(self) -> None:
+        for channel in self._consumer_channels:
+            if not channel.is_closed:
+                await channel.close()
+        self._consumer_channels.clear()
+        if self._channels is not None:
+            await self._channels.close()
+            self._channels = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
@@ -0,0 +1,88 @@
+"""
+Формат тел сообщений всех очередей и exchange сервиса.
+
+Тело: 2 байта заголовка (версия схемы, флаги) и payload в msgpack;
+payload длиннее порога сжимается zlib (флаг COMPRESSED). Длинные промпты
+и результаты так занимают меньше места в очереди и в сети, а короткие
+служебные сообщения не платят за сжатие.
+
+Сообщения до появления конверта - JSON-объекты, начинаются с "{" -
+читаются как раньше, чтобы очереди не нужно было вычищать при выкатке.
+"""
+import datetime
+import enum
+import json
+import zlib
+from typing import Any
+from uuid import UUID
+
+import msgpack
+
+from config.app_config import Settings
+
+
+SCHEMA_VERSION = 1
+# Флаги второго байта заголовка
+COMPRESSED = 0x01
+
+_LEGACY_JSON_PREFIX = ord("{")
+_COMPRESS_LEVEL = 1  # Быстрое сжатие: текст жмется хорошо и на минимальном уровне
+
+settings = Settings()
+COMPRESS_MIN_BYTES = settings.ENVELOPE_COMPRESS_MIN_BYTES
+
+
+class EnvelopeError(ValueError):
+    """Тело сообщения не разбирается: неизвестная версия, флаги или битый payload."""
+
+
+def _default(value: Any) -> Any:
+    # Типы, которые встречаются в сообщениях, передаются строками, как раньше в JSON
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot encode {type(value).__name__} in a message")
+
+
+def encode(payload: dict, compress_min_bytes: int = COMPRESS_MIN_BYTES) -> bytes:
+    """Кодирует payload в тело сообщения; compress_min_bytes=0 отключает сжатие."""
+    packed = msgpack.packb(payload, default=_default, use_bin_type=True)
+    flags = 0
+    if compress_min_bytes and len(packed) >= compress_min_bytes:
+        compressed = zlib.compress(packed, _COMPRESS_LEVEL)
+        # Несжимаемый payload (уже сжатые данные) оставляем как есть
+        if len(compressed) < len(packed):
+            packed = compressed
+            flags |= COMPRESSED
+    return bytes((SCHEMA_VERSION, flags)) + packed
+
+
+def decode(body: bytes) -> dict:
+    """Разбирает тело сообщения любой поддерживаемой версии."""
+    if not body:
+        raise EnvelopeError("Empty message body")
+    version = body[0]
+    if version == _LEGACY_JSON_PREFIX:
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise EnvelopeError(f"Malformed legacy JSON message: {e}") from e
+    if version != SCHEMA_VERSION or len(body) < 2:
+        raise EnvelopeError(f"Unsupported message schema version {version}")
+
+    flags = body[1]
+    if flags & ~COMPRESSED:
+        raise EnvelopeError(f"Unknown message flags {flags:#04x}")
+    packed = body[2:]
+    try:
+        if flags & COMPRESSED:
+            packed = zlib.decompress(packed)
+        payload = msgpack.unpackb(packed, raw=False)
+    except (zlib.error, ValueError, msgpack.UnpackException) as e:
+        raise EnvelopeError(f"Malformed message payload: {e}") from e
+    if not isinstance(payload, dict):
+        raise EnvelopeError("Message payload is not a mapping")
+    return payload
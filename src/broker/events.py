@@ -0,0 +1,46 @@
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from broker import envelope
+from broker.transport import Subscription, get_transport
+from config.app_config import TASK_EVENTS_EXCHANGE
+
+logger = logging.getLogger(__name__)
+
+
+TaskEventsHandler = Callable[[List[dict]], Awaitable[None]]
+
+
+async def publish_task_events(events: List[dict]) -> None:
+    """
+    Публикует события завершения пачкой в одном сообщении.
+
+    Событие: task_id, status, result, completed_at (ISO). Слушатели - кэши
+    статусов в репликах API; события не персистентные, при промахе API
+    читает задачу из БД.
+    """
+    body = envelope.encode({"tasks": events})
+    await get_transport().publish("", body, exchange=TASK_EVENTS_EXCHANGE, persistent=False)
+
+
+class TaskEventsConsumer:
+    """Подписка процесса на fanout событий: каждая реплика получает все события."""
+
+    def __init__(self, handler: TaskEventsHandler):
+        self._handler = handler
+        self._subscription: Optional[Subscription] = None
+
+    async def start(self) -> None:
+        self._subscription = await get_transport().subscribe(TASK_EVENTS_EXCHANGE, self._on_message)
+
+    async def _on_message(self, body: bytes) -> None:
+        try:
+            events = envelope.decode(body)["tasks"]
+            await self._handler(events)
+        except Exception as e:
+            logger.warning(f"Failed to handle task events: {e}")
+
+    async def stop(self) -> None:
+        if self._subscription is not None:
+            await self._subscription.close()
+            self._subscription = None
@@ -0,0 +1,183 @@
+"""
+Транспорт в памяти процесса: API и оба воркера в одном event loop без
+RabbitMQ (локальный запуск, бенчмарки).
+
+Повторяет семантику, на которую опирается сервис: очереди с prefetch и
+подтверждениями для воркеров, fanout и direct exchange для событий.
+Сообщения не переживают процесс - для продакшена остается AMQP.
+"""
+import asyncio
+import itertools
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from broker.transport import EventCallback, MessageCallback, Subscription, Transport
+
+
+# Хук публикации (exchange, routing_key, body, perf_counter) - для замеров в бенчмарках
+PublishHook = Callable[[str, str, bytes, float], None]
+
+
+class InProcessMessage:
+    """Сообщение очереди: тот же интерфейс, что у aio_pika.IncomingMessage."""
+
+    def __init__(self, queue: "_Queue", body: bytes, headers: Optional[dict] = None, priority: int = 0):
+        self.body = body
+        self.headers = headers or {}
+        self.priority = priority
+        self.redelivered = False
+        self._queue = queue
+        self._settled = False
+
+    def _settle(self) -> None:
+        if not self._settled:
+            self._settled = True
+            self._queue.release()
+
+    async def ack(self) -> None:
+        self._settle()
+
+    async def nack(self, requeue: bool = True) -> None:
+        self._settle()
+        if requeue:
+            self._queue.requeue(self)
+
+    async def reject(self, requeue: bool = False) -> None:
+        await self.nack(requeue=requeue)
+
+
+class _Queue:
+    """Очередь с приоритетами, как x-max-priority в RabbitMQ: внутри приоритета - FIFO."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.unacked = 0
+        self._released = asyncio.Event()
+        self._sequence = itertools.count()
+
+    def _put(self, message: InProcessMessage) -> None:
+        self.items.put_nowait((-message.priority, next(self._sequence), message))
+
+    def put(self, body: bytes, headers: Optional[dict], priority: int = 0) -> None:
+        self._put(InProcessMessage(self, body, headers, priority))
+
+    def requeue(self, message: InProcessMessage) -> None:
+        retry = InProcessMessage(self, message.body, message.headers, message.priority)
+        retry.redelivered = True
+        self._put(retry)
+
+    async def get(self) -> InProcessMessage:
+        _, _, message = await self.items.get()
+        return message
+
+    def release(self) -> None:
+        self.unacked -= 1
+        self._released.set()
+
+    async def wait_for_slot(self, prefetch: int) -> None:
+        while prefetch and self.unacked >= prefetch:
+            self._released.clear()
+            await self._released.wait()
+
+
+class _Subscriber(Subscription):
+    def __init__(self, subscribers: List["_Subscriber"], routing_key: Optional[str], callback: EventCallback):
+        self.routing_key = routing_key
+        self.callback = callback
+        self._subscribers = subscribers
+
+    async def close(self) -> None:
+        if self in self._subscribers:
+            self._subscribers.remove(self)
+
+
+class InProcessTransport(Transport):
+    """
+    Очереди по имени (exchange "") и exchange с подписчиками.
+
+    Подписка с routing_key=None получает все сообщения exchange (fanout),
+    с конкретным ключом - только свои (direct). Сообщения exchange без
+    подписчиков отбрасываются, как и в RabbitMQ.
+    """
+
+    def __init__(self, on_publish: Optional[PublishHook] = None):
+        self._queues: Dict[str, _Queue] = {}
+        self._subscribers: Dict[str, List[_Subscriber]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._on_publish = on_publish
+
+    def _queue(self, name: str) -> _Queue:
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = self._queues[name] = _Queue(name)
+        return queue
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def publish(
+            self,
+            routing_key: str,
+            body: bytes,
+            *,
+            exchange: str = "",
+            persistent: bool = True,
+            headers: Optional[dict] = None,
+            priority: int = 0
+    ) -> None:
+        if self._on_publish is not None:
+            self._on_publish(exchange, routing_key, body, time.perf_counter())
+        if not exchange:
+            self._queue(routing_key).put(body, headers, priority)
+            return
+        for subscriber in self._subscribers.get(exchange, []):
+            if subscriber.routing_key is None or subscriber.routing_key == routing_key:
+                self._spawn(subscriber.callback(body))
+
+    async def publish_many(
+            self,
+            routing_key: str,
+            bodies: Iterable[bytes],
+            *,
+            exchange: str = "",
+            persistent: bool = True,
+            priority: int = 0
+    ) -> None:
+        for body in bodies:
+            await self.publish(routing_key, body, exchange=exchange, persistent=persistent, priority=priority)
+
+    async def subscribe(
+            self,
+            exchange: str,
+            callback: EventCallback,
+            *,
+            routing_key: Optional[str] = None
+    ) -> Subscription:
+        subscribers = self._subscribers.setdefault(exchange, [])
+        subscriber = _Subscriber(subscribers, routing_key, callback)
+        subscribers.append(subscriber)
+        return subscriber
+
+    async def consume(self, queue_name: str, callback: MessageCallback, *, prefetch: int) -> None:
+        """Доставляет сообщения очереди в callback, держа не больше prefetch неподтвержденных."""
+        queue = self._queue(queue_name)
+
+        async def deliver():
+            while True:
+                await queue.wait_for_slot(prefetch)
+                message = await queue.get()
+                queue.unacked += 1
+                await callback(message)
+
+        self._spawn(deliver())
+
+    def depth(self, queue_name: str) -> int:
+        return self._queue(queue_name).items.qsize()
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
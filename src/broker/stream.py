@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+from broker import envelope
+from broker.transport import Subscription, get_transport
+from config.app_config import RESULT_QUEUE
+
+logger = logging.getLogger(__name__)
+
+# Типы событий потока задачи: token публикует ML воркер, done отдает клиенту API
+# по событию завершения DB воркера, то есть уже после коммита результата
+TOKEN_EVENT = "token"
+DONE_EVENT = "done"
+
+
+async def publish_stream_event(task_id: str, event: str, **payload) -> None:
+    """Публикует событие в поток задачи. Поток не персистентный: его слушают только подключенные клиенты."""
+    body = envelope.encode({"event": event, "task_id": task_id, **payload})
+    await get_transport().publish(task_id, body, exchange=RESULT_QUEUE, persistent=False)
+
+
+class TaskStream:
+    """
+    Подписка на поток событий одной задачи.
+
+    Подписка оформляется при входе в контекст, поэтому события,
+    опубликованные после входа, не теряются - статус задачи в БД стоит
+    проверять уже внутри контекста.
+    """
+
+    def __init__(self, task_id: str):
+        self._task_id = task_id
+        self._subscription: Optional[Subscription] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self) -> "TaskStream":
+        self._subscription = await get_transport().subscribe(
+            RESULT_QUEUE, self._queue.put, routing_key=self._task_id
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._subscription.close()
+
+    async def events(self, idle_timeout: float, until: asyncio.Future) -> AsyncIterator[Optional[dict]]:
+        """
+        Отдает события по мере прихода; None - если за idle_timeout ничего
+        не пришло (повод для keepalive). Завершается, когда until выполнен
+        и уже пришедшие события отданы.
+        """
+        while True:
+            if until.done() and self._queue.empty():
+                return
+            get = asyncio.ensure_future(self._queue.get())
+            await asyncio.wait((get, until), timeout=idle_timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not get.done():
+                get.cancel()
+                if not until.done():
+                    yield None
+                continue
+            yield envelope.decode(get.result())
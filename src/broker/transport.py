@@ -0,0 +1,154 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Iterable, Optional
+
+from config.app_config import Settings, TASK_QUEUE, DB_QUEUE, RESULT_QUEUE, TASK_EVENTS_EXCHANGE, TASK_QUEUE_MAX_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+
+# Рабочие очереди сервиса: сообщения подтверждаются после обработки
+WORK_QUEUES = (TASK_QUEUE, DB_QUEUE)
+# Аргументы объявления очередей: task_queue - приоритетная (старшие классы задач идут вперед)
+QUEUE_ARGUMENTS = {
+    TASK_QUEUE: {"x-max-priority": TASK_QUEUE_MAX_PRIORITY},
+}
+# Exchange событий и их типы: direct - по routing key, fanout - всем подписчикам
+EXCHANGES = {
+    RESULT_QUEUE: "direct",
+    TASK_EVENTS_EXCHANGE: "fanout",
+}
+
+# Обработчик сообщения рабочей очереди: у сообщения есть body, priority, ack(), nack(requeue=), reject(requeue=)
+MessageCallback = Callable[[object], Awaitable[None]]
+# Обработчик события exchange: получает только тело, подтверждений нет
+EventCallback = Callable[[bytes], Awaitable[None]]
+
+
+class Subscription(ABC):
+    """Подписка на exchange; close() отписывает."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+
+class Transport(ABC):
+    """
+    Транспорт сообщений между API и воркерами.
+
+    Рабочие очереди (consume) доставляют каждое сообщение одному
+    потребителю и ждут подтверждения; exchange (subscribe) рассылают события
+    всем подписчикам без подтверждений, события без подписчиков теряются.
+    """
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(
+            self,
+            routing_key: str,
+            body: bytes,
+            *,
+            exchange: str = "",
+            persistent: bool = True,
+            headers: Optional[dict] = None,
+            priority: int = 0
+    ) -> None:
+        """Публикует сообщение: в очередь routing_key (exchange="") или в exchange."""
+
+    @abstractmethod
+    async def publish_many(
+            self,
+            routing_key: str,
+            bodies: Iterable[bytes],
+            *,
+            exchange: str = "",
+            persistent: bool = True,
+            priority: int = 0
+    ) -> None:
+        """Публикует пачку сообщений с общими параметрами."""
+
+    @abstractmethod
+    async def consume(self, queue_name: str, callback: MessageCallback, *, prefetch: int) -> None:
+        """Начинает доставку сообщений очереди; неподтвержденных не больше prefetch."""
+
+    @abstractmethod
+    async def subscribe(
+            self,
+            exchange: str,
+            callback: EventCallback,
+            *,
+            routing_key: Optional[str] = None
+    ) -> Subscription:
+        """Подписка на exchange; для direct - только на сообщения с routing_key."""
+
+
+transport: Transport | None = None
+_users = 0
+
+
+async def open_transport(kind: Optional[str] = None, url: Optional[str] = None) -> Transport:
+    """
+    Открывает общий для процесса транспорт (BROKER_TRANSPORT: amqp | inprocess).
+
+    Вызовы считаются: API и воркеры, запущенные в одном процессе, делят один
+    транспорт, а закрывается он последним close_transport.
+    """
+    global transport, _users
+    _users += 1
+    if transport is not None:
+        return transport
+
+    settings = Settings()
+    kind = kind or settings.BROKER_TRANSPORT
+    # Реализации импортируют этот модуль ради базового класса - импортируем их здесь
+    if kind == "inprocess":
+        from broker.inprocess import InProcessTransport
+        created = InProcessTransport()
+    elif kind == "amqp":
+        from broker.amqp import AMQPTransport
+        created = AMQPTransport(
+            url=url or settings.RABBITMQ_URL,
+            pool_size=settings.AMQP_CHANNEL_POOL_SIZE,
+            publisher_confirms=settings.AMQP_PUBLISHER_CONFIRMS,
+        )
+    else:
+        _users -= 1
+        raise ValueError(f"Unknown BROKER_TRANSPORT: {kind}")
+
+    try:
+        await created.open()
+    except Exception:
+        _users -= 1
+        raise
+    transport = created
+    logger.info(f"Message transport opened: {kind}")
+    return transport
+
+
+def get_transport() -> Transport:
+    if transport is None:
+        raise RuntimeError("Transport not initialized")
+    return transport
+
+
+def set_transport(instance: Optional[Transport]) -> None:
+    """Подставляет готовый транспорт (бенчмарки, встраивание)."""
+    global transport, _users
+    transport = instance
+    _users = 1 if instance is not None else 0
+
+
+async def close_transport() -> None:
+    global transport, _users
+    if transport is None:
+        return
+    _users = max(_users - 1, 0)
+    if _users == 0:
+        await transport.close()
+        transport = None
@@ -3,9 +3,20 @@ from functools import lru_cache
 from typing import Optional
 
 
-TASK_QUEUE = 'task_queue'
-RESULT_QUEUE = 'result_queue'
+# Приоритетная очередь задач ML (x-max-priority). Аргументы уже объявленной очереди RabbitMQ
+# не меняет (PRECONDITION_FAILED), поэтому приоритетная очередь объявлена под новым именем
+TASK_QUEUE = 'task_queue.priority'
+# Прежняя очередь задач без приоритетов: ML воркер дочитывает ее, пока в нее публикуют
+# реплики API старой версии; удаляется вместе с потреблением в следующем релизе
+LEGACY_TASK_QUEUE = 'task_queue'
+RESULT_QUEUE = 'result_queue'  # direct exchange: потоки токенов, routing key = task_id
 DB_QUEUE = 'db_queue'
+TASK_EVENTS_EXCHANGE = 'task_events'  # fanout: события завершения задач после записи в БД
+
+# Классы приоритета задач ML (priority сообщения в task_queue): больший обслуживается раньше
+TASK_PRIORITY_BATCH = 0  # POST /predict/batch
+TASK_PRIORITY_INTERACTIVE = 1  # POST /predict
+TASK_QUEUE_MAX_PRIORITY = TASK_PRIORITY_INTERACTIVE
 
 class Settings(BaseSettings):
 
@@ -16,6 +27,17 @@ class Settings(BaseSettings):
     DB_PASS: Optional[str] = None
     DB_NAME: Optional[str] = None
 
+    # Database connection pool (на процесс)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_S: float = 30.0  # Сколько ждать свободное соединение
+    DB_POOL_RECYCLE_S: int = 3600
+    DB_POOL_PRE_PING: bool = True
+    DB_CONNECT_TIMEOUT_S: float = 10.0
+    DB_COMMAND_TIMEOUT_S: Optional[float] = None  # Таймаут запроса asyncpg (None - без ограничения)
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Кэш подготовленных выражений asyncpg на соединение
+    DB_COMPILED_CACHE_SIZE: int = 500  # Кэш скомпилированного SQL SQLAlchemy
+
     # Application settings
     APP_NAME: Optional[str] = None
     DEBUG: Optional[bool] = None
@@ -27,10 +49,76 @@ class Settings(BaseSettings):
     MQ_PORT1: Optional[int] = None  # Например, для Management UI
     MQ_PORT2: Optional[int] = None  # Например, для AMQP
     MQ_HOST: Optional[str] = None
+    BROKER_TRANSPORT: str = "amqp"  # amqp - RabbitMQ; inprocess - очереди в памяти, все в одном процессе
+    AMQP_CHANNEL_POOL_SIZE: int = 8  # Каналов в пуле публикатора на процесс
+    AMQP_PUBLISHER_CONFIRMS: bool = True  # Ждать подтверждения брокера на каждую публикацию
+    ENVELOPE_COMPRESS_MIN_BYTES: int = 1024  # Сжимать тела сообщений от этого размера; 0 - не сжимать
 
     WEB_PROXY1: Optional[str] = None
     WEB_PROXY2: Optional[str] = None
 
+    # ML worker settings
+    ML_BATCH_SIZE: int = 8  # Максимальный размер микро-батча
+    ML_BATCH_MAX_WAIT_MS: int = 20  # Сколько ждать добора батча после первой задачи
+    ML_EXECUTOR: str = "thread"  # thread | process
+    ML_EXECUTOR_WORKERS: int = 1  # Число процессов инференса (для process)
+    ML_MODEL_PATH: Optional[str] = None  # Локальный GGUF по умолчанию, без обращения к HF
+    ML_MODEL_OFFLINE: bool = False  # Не ходить в сеть: только ML_MODEL_PATH или кэш HF
+    ML_HF_DEBUG: bool = False  # Подробные логи huggingface_hub
+    ML_READY_FILE: str = "/tmp/ml_worker.ready"  # Появляется, когда модель прогрета и воркер потребляет задачи
+    ML_MODEL_MEMORY_MB: int = 4096  # Бюджет памяти на резидентные модели процесса
+    ML_MODEL_POLL_S: int = 30  # Как часто перечитывать активную модель из ml_models
+    ML_CACHE_BACKEND: str = "tiered"  # none | memory | tiered (память + SQLite на общем томе)
+    ML_CACHE_MEMORY_ITEMS: int = 128
+    ML_CACHE_PATH: str = "/root/.cache/ml_service/results.sqlite3"
+    ML_CACHE_TTL_S: int = 7 * 24 * 3600
+    ML_CACHE_MAX_MB: int = 256
+    ML_PROMPT_CACHE: str = "ram"  # none | ram | disk - кэш KV-состояния префиксов llama.cpp
+    ML_PROMPT_CACHE_MB: int = 512
+    ML_PROMPT_CACHE_DIR: str = "/root/.cache/ml_service/prompt_cache"
+    ML_STREAM_TOKENS: bool = True  # Публиковать токены по мере генерации (только для thread)
+    ML_SCHEDULER_WINDOW: int = 16  # Задач сверх обрабатываемых в буфере планировщика одной реплики
+
+    # DB worker settings
+    DB_WRITE_BATCH_SIZE: int = 100  # Сколько результатов записывать одной транзакцией
+    DB_WRITE_MAX_WAIT_MS: int = 50  # Сколько ждать добора батча записи
+
+    # Task texts (API, DB worker)
+    # Дублировать тексты в прежние колонки input_data/result_data рядом с text_blobs: пока включено,
+    # предыдущая версия сервиса читает задачи и на нее можно откатиться. Выключается перед удалением колонок
+    TASK_TEXTS_LEGACY_COLUMNS: bool = True
+
+    # Metrics
+    METRICS_PORT: int = 9100  # HTTP-листенер /metrics в воркерах (0 - выключен); API отдает /metrics сам
+
+    # Auth caches (API)
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_S: int = 30
+
+    # Password hashing (API)
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # Стоимость bcrypt (log2 числа раундов)
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT_S: float = 2.0
+
+    # Batch submission (API)
+    PREDICT_BATCH_MAX: int = 1000  # Максимум промптов в одном POST /predict/batch
+
+    # Pagination (API)
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 1000
+    EXPORT_CHUNK_ROWS: int = 1000  # Строк за одну выборку серверного курсора при выгрузке истории
+
+    # Task status cache (API)
+    TASK_STATUS_CACHE_SIZE: int = 10000
+    TASK_STATUS_CACHE_TTL_S: int = 600
+    TASK_STATUS_MAX_WAIT_S: int = 60  # Верхняя граница long-polling ?wait=
+
+    # Server-Sent Events
+    SSE_KEEPALIVE_S: int = 15
+    SSE_MAX_IDLE_S: int = 300
+
 
     @property
     def DATABASE_URL_asyncpg(self):
@@ -62,7 +150,7 @@ class Settings(BaseSettings):
 
 
 @lru_cache()
-async def get_settings() -> Settings:
-    settings = Settings()
-    await settings.validate()
-    return settings
\ No newline at end of file
+def get_settings() -> Settings:
+    # Синхронная: lru_cache на async-функции кэширует корутину, и второй await падает.
+    # Проверка конфигурации - await settings.validate() при создании engine
+    return Settings()
\ No newline at end of file
@@ -1,29 +1,47 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
-from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import SQLModel
 
 from config.app_config import get_settings
+from database.pool import InstrumentedAsyncPool
+from metrics.registry import REGISTRY
 
 
 engine: AsyncEngine | None = None
 AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
 
-async def get_database_engine():
+POOL_CONNECTIONS = REGISTRY.gauge("db_pool_connections", "Pool connections by state", ("state",))
+
+async def get_database_engine() -> AsyncEngine:
+    """
+    Создает engine и фабрику сессий процесса при первом вызове, дальше
+    возвращает уже созданный engine: один пул соединений на процесс.
+    """
     global engine, AsyncSessionLocal
 
-    settings = await get_settings()
+    if engine is not None:
+        return engine
+
+    settings = get_settings()
+    await settings.validate()
 
     engine = create_async_engine(
         url=settings.DATABASE_URL_asyncpg,
         echo=settings.DEBUG,
-        poolclass=AsyncAdaptedQueuePool,
-        pool_size=5,
-        max_overflow=10,
-        pool_pre_ping=True,
-        pool_recycle=3600
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_S,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE_S,
+        query_cache_size=settings.DB_COMPILED_CACHE_SIZE,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "command_timeout": settings.DB_COMMAND_TIMEOUT_S,
+            "timeout": settings.DB_CONNECT_TIMEOUT_S,
+        },
     )
 
     AsyncSessionLocal = async_sessionmaker(
@@ -31,6 +49,27 @@ async def get_database_engine():
         class_=AsyncSession,
         expire_on_commit=False,
     )
+    return engine
+
+
+def pool_stats() -> Dict[str, object]:
+    """Состояние пула соединений процесса (пусто, если engine еще не создан)."""
+    if engine is None:
+        return {}
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, InstrumentedAsyncPool):
+        return {"status": pool.status()}
+    return pool.snapshot()
+
+
+def _collect_pool_metrics() -> None:
+    stats = pool_stats()
+    for state in ("size", "checked_in", "checked_out", "overflow"):
+        if state in stats:
+            POOL_CONNECTIONS.labels(state).set(stats[state])
+
+
+REGISTRY.on_collect("db_pool", _collect_pool_metrics)
 
 
 @asynccontextmanager
@@ -56,10 +95,11 @@ async def get_async_task_session() -> AsyncGenerator[AsyncSession, None]:
 
 async def disconnect_db():
     """Disposes the global engine."""
-    global engine
+    global engine, AsyncSessionLocal
     if engine:
         await engine.dispose()
         engine = None
+        AsyncSessionLocal = None
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
@@ -81,5 +121,13 @@ async def init_db(drop_all: bool = False) -> None:
             if drop_all:
                 await conn.run_sync(SQLModel.metadata.drop_all)
             await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(_create_missing_indexes)
     except Exception as e:
-        raise
\ No newline at end of file
+        raise
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """create_all не добавляет новые индексы к уже существующим таблицам - досоздаем их."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Перенос текстов задач из prediction_tasks (input_data, result_data) в
+text_blobs. Запускается вручную, не при старте сервиса.
+
+Порядок выкатки (expand/contract):
+    1. expand   - до деплоя новой версии: колонки ссылок и внешние ключи
+                  (NOT VALID, без проверки всей таблицы), input_data
+                  становится необязательной. Только изменения каталога,
+                  таблица не переписывается.
+    2. деплой   - новая версия пишет ссылки и, пока включен
+                  TASK_TEXTS_LEGACY_COLUMNS, сами тексты в старые колонки:
+                  старые реплики и откат продолжают работать.
+    3. backfill - когда старых реплик не осталось: ссылки для прежних задач
+                  пачками по --batch-rows строк, каждая пачка - своя
+                  короткая транзакция. Можно прерывать и перезапускать.
+    4. status   - сколько задач еще без ссылок; 0 - можно выключать
+                  TASK_TEXTS_LEGACY_COLUMNS.
+
+Удаление input_data/result_data - отдельный релиз, после того как чтение
+через text_blobs проверено в работе.
+
+Запуск (из каталога src):
+    python -m database.migrate_task_texts expand
+    python -m database.migrate_task_texts backfill --batch-rows 5000 --pause-s 0.1
+    python -m database.migrate_task_texts status
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.infrastructure.models.text_blob import TextBlob
+from database import database
+
+logger = logging.getLogger(__name__)
+
+# DDL не ждет дольше этого за долгими транзакциями приложения, а падает - запрос можно повторить
+DDL_LOCK_TIMEOUT = "5s"
+
+# Имена совпадают с внешними ключами модели PredictionTask: на новой базе expand ничего не меняет
+_FOREIGN_KEYS = {
+    "fk_prediction_tasks_input_hash": "input_hash",
+    "fk_prediction_tasks_result_hash": "result_hash",
+}
+
+# Задачи пачки, которым еще нужны ссылки
+_PENDING_ROWS = """
+    id > :after AND id <= :last
+    AND ((input_hash IS NULL AND input_data IS NOT NULL) OR (result_hash IS NULL AND result_data IS NOT NULL))
+"""
+
+
+async def expand(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+        await conn.run_sync(lambda sync_conn: TextBlob.__table__.create(sync_conn, checkfirst=True))
+        for column_name in _FOREIGN_KEYS.values():
+            await conn.execute(text(f"ALTER TABLE prediction_tasks ADD COLUMN IF NOT EXISTS {column_name} bytea"))
+        existing = set((await conn.execute(
+            text("SELECT conname FROM pg_constraint WHERE conrelid = 'prediction_tasks'::regclass")
+        )).scalars())
+        for name, column_name in _FOREIGN_KEYS.items():
+            if name not in existing:
+                # NOT VALID: новые строки проверяются сразу, старые - при VALIDATE CONSTRAINT в релизе очистки
+                await conn.execute(text(
+                    f"ALTER TABLE prediction_tasks ADD CONSTRAINT {name} "
+                    f"FOREIGN KEY ({column_name}) REFERENCES text_blobs (hash) NOT VALID"
+                ))
+        await conn.execute(text("ALTER TABLE prediction_tasks ALTER COLUMN input_data DROP NOT NULL"))
+    logger.info("prediction_tasks expanded: input_hash, result_hash, text_blobs")
+
+
+async def _backfill_batch(engine: AsyncEngine, after: UUID, batch_rows: int) -> Optional[UUID]:
+    """Переносит тексты следующих batch_rows задач по id; возвращает последний id или None в конце таблицы."""
+    async with engine.begin() as conn:
+        last = (await conn.execute(
+            text("SELECT max(id) FROM (SELECT id FROM prediction_tasks WHERE id > :after ORDER BY id LIMIT :n) AS batch"),
+            {"after": after, "n": batch_rows},
+        )).scalar_one()
+        if last is None:
+            return None
+        bounds = {"after": after, "last": last}
+        # sha256(convert_to(..., 'UTF8')) совпадает с text_hash на стороне приложения
+        await conn.execute(text(f"""
+            INSERT INTO text_blobs (hash, body)
+            SELECT sha256(convert_to(body, 'UTF8')), body
+            FROM (
+                SELECT input_data AS body FROM prediction_tasks
+                WHERE {_PENDING_ROWS} AND input_hash IS NULL AND input_data IS NOT NULL
+                UNION
+                SELECT result_data FROM prediction_tasks
+                WHERE {_PENDING_ROWS} AND result_hash IS NULL AND result_data IS NOT NULL
+            ) AS texts
+            ORDER BY 1
+            ON CONFLICT (hash) DO NOTHING
+        """), bounds)
+        await conn.execute(text(f"""
+            UPDATE prediction_tasks
+            SET input_hash = coalesce(input_hash, sha256(convert_to(input_data, 'UTF8'))),
+                result_hash = coalesce(result_hash, sha256(convert_to(result_data, 'UTF8')))
+            WHERE {_PENDING_ROWS}
+        """), bounds)
+        return last
+
+
+async def backfill(engine: AsyncEngine, batch_rows: int, pause_s: float) -> None:
+    after = UUID(int=0)
+    batches = 0
+    started = time.perf_counter()
+    while True:
+        last = await _backfill_batch(engine, after, batch_rows)
+        if last is None:
+            break
+        after = last
+        batches += 1
+        if batches % 100 == 0:
+            logger.info(f"Backfilled {batches} batches, last id {after}")
+        # Пауза между пачками оставляет место нагрузке приложения и репликации
+        await asyncio.sleep(pause_s)
+    logger.info(f"Backfill finished: {batches} batches in {time.perf_counter() - started:.1f}s")
+
+
+async def status(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn:
+        pending = (await conn.execute(text("""
+            SELECT count(*) FROM prediction_tasks
+            WHERE (input_hash IS NULL AND input_data IS NOT NULL)
+               OR (result_hash IS NULL AND result_data IS NOT NULL)
+        """))).scalar_one()
+    logger.info(f"Tasks without text references: {pending}")
+    return pending
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("step", choices=("expand", "backfill", "status"))
+    parser.add_argument("--batch-rows", type=int, default=5000)
+    parser.add_argument("--pause-s", type=float, default=0.1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    engine = await database.get_database_engine()
+    try:
+        if args.step == "expand":
+            await expand(engine)
+        elif args.step == "backfill":
+            await backfill(engine, args.batch_rows, args.pause_s)
+        else:
+            await status(engine)
+    finally:
+        await database.disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+import time
+from typing import Dict, List
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from metrics.registry import REGISTRY
+
+
+# Границы корзин гистограммы латентности выдачи соединения, секунды
+CHECKOUT_BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CHECKOUT_SECONDS = REGISTRY.histogram(
+    "db_pool_checkout_seconds", "Time to get a connection from the pool", buckets=CHECKOUT_BUCKETS_S
+)
+CHECKOUT_TIMEOUTS = REGISTRY.counter("db_pool_checkout_timeouts_total", "Pool checkouts that timed out")
+
+
+class PoolStats:
+    """Счетчики выдачи соединений из пула: сколько ждали и сколько раз не дождались."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_s_total = 0.0
+        self.wait_s_max = 0.0
+        self.bucket_counts: List[int] = [0] * (len(CHECKOUT_BUCKETS_S) + 1)
+
+    def record(self, elapsed_s: float, timed_out: bool) -> None:
+        if timed_out:
+            self.timeouts += 1
+            CHECKOUT_TIMEOUTS.inc()
+        else:
+            self.checkouts += 1
+        CHECKOUT_SECONDS.observe(elapsed_s)
+        self.wait_s_total += elapsed_s
+        self.wait_s_max = max(self.wait_s_max, elapsed_s)
+        for i, bound in enumerate(CHECKOUT_BUCKETS_S):
+            if elapsed_s <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+    def histogram(self) -> Dict[str, int]:
+        """Накопительная гистограмма: число выдач не дольше le секунд."""
+        cumulative = {}
+        total = 0
+        for bound, count in zip(CHECKOUT_BUCKETS_S, self.bucket_counts):
+            total += count
+            cumulative[str(bound)] = total
+        cumulative["+Inf"] = total + self.bucket_counts[-1]
+        return cumulative
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool с замером времени выдачи соединения.
+
+    В замер входит ожидание свободного соединения и открытие нового (overflow),
+    поэтому рост латентности здесь при спокойной базе означает исчерпание пула.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started, timed_out=False)
+        return connection
+
+    def recreate(self):
+        # Пул пересоздается при dispose и инвалидации - счетчики сохраняем
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.stats.checkouts,
+            "timeouts": self.stats.timeouts,
+            "wait_s_total": self.stats.wait_s_total,
+            "wait_s_max": self.stats.wait_s_max,
+            "checkout_latency_s": self.stats.histogram(),
+        }
@@ -0,0 +1,42 @@
+import time
+
+from metrics.registry import REGISTRY, Registry
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: гистограмма латентности запросов по шаблону маршрута.
+
+    Метка route - шаблон пути (/api/ml/tasks/{task_id}), а не сам путь,
+    чтобы число рядов не росло с числом идентификаторов. Для потоковых
+    ответов (SSE, выгрузки) замеряется вся длительность ответа.
+    """
+
+    def __init__(self, app, registry: Registry = REGISTRY):
+        self.app = app
+        self._latency = registry.histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency by route template",
+            ("method", "route", "status"),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # FastAPI кладет сработавший маршрут в scope при сопоставлении
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self._latency.labels(scope["method"], route, status_code).observe(time.perf_counter() - started)
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import Optional
+
+from metrics.registry import CONTENT_TYPE, REGISTRY, Registry
+
+logger = logging.getLogger(__name__)
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, registry: Registry) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны - дочитываем до пустой строки
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, content_type, body = "200 OK", CONTENT_TYPE, registry.render().encode()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(
+        port: int,
+        host: str = "0.0.0.0",
+        registry: Registry = REGISTRY
+) -> Optional[asyncio.AbstractServer]:
+    """
+    Минимальный HTTP-листенер GET /metrics для воркеров без веб-фреймворка.
+    port=0 отключает листенер.
+    """
+    if not port:
+        return None
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, registry), host, port)
+    logger.info(f"Metrics listener on {host}:{port}/metrics")
+    return server
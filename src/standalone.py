@@ -0,0 +1,45 @@
+"""
+API, ML воркер и DB воркер в одном процессе на транспорте в памяти -
+для локальной разработки и демо без RabbitMQ (база по-прежнему из .env).
+
+Запуск (из каталога src):
+    python standalone.py --port 8080
+"""
+import argparse
+import asyncio
+import logging
+
+import uvicorn
+
+from broker.transport import open_transport, close_transport
+from worker.db.db_worker import main_db_worker
+from worker.ml.ml_worker import main_ml_worker
+
+logger = logging.getLogger(__name__)
+
+
+async def main(host: str, port: int) -> None:
+    # Открываем транспорт до старта API и воркеров - они получат этот же экземпляр
+    await open_transport("inprocess")
+    workers = [
+        asyncio.create_task(main_ml_worker(serve_metrics=False)),
+        asyncio.create_task(main_db_worker(serve_metrics=False)),
+    ]
+    server = uvicorn.Server(uvicorn.Config("app.api:app", host=host, port=port, log_level="info"))
+    try:
+        await server.serve()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await close_transport()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.host, args.port))
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from metrics.registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+BatchHandler = Callable[[List[Any]], Awaitable[None]]
+
+CONSUMED = REGISTRY.counter("queue_messages_consumed_total", "Messages consumed from a queue", ("queue",))
+BATCH_SIZE = REGISTRY.histogram(
+    "queue_batch_size", "Messages per processed micro-batch", ("queue",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+BATCH_SECONDS = REGISTRY.histogram(
+    "queue_batch_processing_seconds", "Time to process one micro-batch", ("queue",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+class MicroBatcher:
+    """
+    Собирает входящие сообщения в микро-батчи.
+
+    Батч закрывается, когда набрано max_batch_size сообщений или с момента
+    получения первого сообщения прошло max_wait_s секунд. Глубину очереди
+    ограничивает prefetch канала: брокер не отдаст больше неподтвержденных
+    сообщений, чем разрешено.
+
+    Одновременно обрабатывается не больше max_concurrent_batches батчей;
+    пока все слоты заняты, новые сообщения копятся в буфере и попадут
+    в следующий, более полный батч.
+
+    name - метка queue в метриках потребления и обработки батчей.
+    queue - буфер сообщений с интерфейсом asyncio.Queue (put, get,
+    get_nowait), определяет порядок попадания в батчи; по умолчанию FIFO.
+    """
+
+    def __init__(
+            self,
+            handler: BatchHandler,
+            max_batch_size: int,
+            max_wait_s: float,
+            max_concurrent_batches: int = 1,
+            name: str = "default",
+            queue: Optional[Any] = None
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self._handler = handler
+        self._max_batch_size = max_batch_size
+        self._max_wait_s = max(max_wait_s, 0.0)
+        self._max_concurrent_batches = max(max_concurrent_batches, 1)
+        self._queue = queue if queue is not None else asyncio.Queue()
+        self._consumed = CONSUMED.labels(name)
+        self._batch_size = BATCH_SIZE.labels(name)
+        self._batch_seconds = BATCH_SECONDS.labels(name)
+
+    async def submit(self, message: Any) -> None:
+        """Колбэк для queue.consume: кладет сообщение в буфер батчера."""
+        await self._queue.put(message)
+
+    async def _next_batch(self) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._max_wait_s
+
+        while len(batch) < self._max_batch_size:
+            # Сначала забираем все, что уже лежит в буфере, без ожидания
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _handle(self, batch: List[Any], slots: asyncio.Semaphore) -> None:
+        self._consumed.inc(len(batch))
+        self._batch_size.observe(len(batch))
+        started = time.perf_counter()
+        try:
+            await self._handler(batch)
+        except Exception:
+            logger.exception(f"Ошибка обработки батча из {len(batch)} сообщений")
+        finally:
+            self._batch_seconds.observe(time.perf_counter() - started)
+            slots.release()
+
+    async def run(self) -> None:
+        """Бесконечный цикл: формирует батчи и передает их обработчику."""
+        slots = asyncio.Semaphore(self._max_concurrent_batches)
+        in_flight: set[asyncio.Task] = set()
+        try:
+            while True:
+                await slots.acquire()
+                batch = await self._next_batch()
+                task = asyncio.create_task(self._handle(batch, slots))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        finally:
+            for task in in_flight:
+                task.cancel()
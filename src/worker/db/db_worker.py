@@ -1,47 +1,211 @@
 import asyncio
-import json
 import datetime
-from aio_pika import connect_robust, IncomingMessage
+import time
+from typing import List
+from uuid import UUID
+from aio_pika import IncomingMessage
 from sqlalchemy import update
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 
+from broker import envelope
+from broker.events import publish_task_events
+from broker.transport import open_transport, close_transport
 from database.database import get_async_task_session, get_database_engine
 from app.infrastructure.models.prediction_task import PredictionTask, TaskStatus
 from app.infrastructure.models.user import User
 from app.infrastructure.models.transaction import UserTransaction
+from app.infrastructure.services.crud.text_blob import store_texts
 from config.app_config import Settings, DB_QUEUE
+from worker.batching import MicroBatcher
+from metrics.registry import REGISTRY
+from metrics.server import start_metrics_server
 
 
 settings = Settings()
-BROKER_URL = settings.RABBITMQ_URL
-
-async def on_message_db_write(message: IncomingMessage) :
-    async with message.process():
-        data = json.loads(message.body.decode())
-        task_id = data['task_id']
-        result_data = data['result']
-
-        print(f"[DB Worker] Получено задание на запись результата {task_id}")
-
-        # --- АСИНХРОННАЯ ЗАПИСЬ В БД ---
-        async with get_async_task_session() as session:
-            stmt = update(PredictionTask).where(PredictionTask.id == task_id).values(
-                    status=TaskStatus.COMPLETED,
-                    result_data=result_data,
-                    completed_at=datetime.datetime.utcnow()
-                )
-            await session.execute(stmt)
-            await session.commit()
-        print(f"[DB Worker] Успешно записано в БД {task_id}")
-
-async def main_db_worker():
+
+# Пауза перед возвратом батча в очередь, если база недоступна целиком
+DB_UNAVAILABLE_BACKOFF_S = 1.0
+# Классы SQLSTATE, в которых строка ни при чем: соединение (08), ресурсы сервера (53), его остановка (57P)
+UNAVAILABLE_SQLSTATES = ("08", "53", "57P")
+
+WRITE_BATCH_ROWS = REGISTRY.histogram(
+    "db_write_batch_rows", "Results written per bulk transaction",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+WRITE_SECONDS = REGISTRY.histogram("db_write_seconds", "Duration of one results write transaction", ("mode",))
+ROWS_WRITTEN = REGISTRY.counter("db_rows_written_total", "Results written by mode (bulk, single)", ("mode",))
+
+
+def parse_result(message: IncomingMessage) -> dict:
+    data = envelope.decode(message.body)
+    return {
+        'task_id': UUID(data['task_id']),
+        'result_data': data['result'],
+        'status': TaskStatus(data.get('status', TaskStatus.COMPLETED)),
+    }
+
+
+def is_db_unavailable(error: Exception) -> bool:
+    """
+    Ошибка соединения с базой, а не данных конкретной строки.
+
+    Блокировки, таймауты запросов и прочие OperationalError сюда не входят:
+    повтор той же строки их не исправит, и сообщение будет отклонено.
+    """
+    # OSError - соединение не установлено; PoolTimeoutError - в пуле нет свободных соединений
+    if isinstance(error, (OSError, PoolTimeoutError)):
+        return True
+    if not isinstance(error, DBAPIError):
+        return False
+    if error.connection_invalidated:
+        return True
+    sqlstate = getattr(error.orig, "sqlstate", None) or ""
+    return sqlstate.startswith(UNAVAILABLE_SQLSTATES)
+
+
+async def notify_completed(rows: List[dict]):
+    """Рассылает события завершения после коммита (кэши статусов в API)."""
+    if not rows:
+        return
+    try:
+        await publish_task_events([
+            {
+                'task_id': str(row['task_id']),
+                'status': row['status'].value,
+                'result': row['result_data'],
+                'completed_at': row['completed_at'].isoformat(),
+            }
+            for row in rows
+        ])
+    except Exception as e:
+        # Не страшно: API найдет задачу в БД по первичному ключу
+        print(f"[DB Worker] Не удалось опубликовать события завершения: {e}")
+
+
+async def write_results_bulk(rows: List[dict]):
+    """
+    Записывает результаты в одной транзакции: UPDATE ... WHERE id = :id по
+    первичному ключу, выполненный пачкой параметров (executemany) - работает
+    на любой поддерживаемой базе. Тексты результатов сохраняются в
+    text_blobs одной вставкой, задачи получают их ключи (и сам текст, пока
+    включен TASK_TEXTS_LEGACY_COLUMNS).
+    """
+    completed_at = datetime.datetime.utcnow()
+    for row in rows:
+        row['completed_at'] = completed_at
+    legacy = settings.TASK_TEXTS_LEGACY_COLUMNS
+
+    async with get_async_task_session() as session:
+        hashes = await store_texts({row['result_data'] for row in rows if row['result_data'] is not None}, session)
+        await session.execute(update(PredictionTask), [
+            {
+                'id': row['task_id'],
+                'status': row['status'],
+                'result_hash': hashes.get(row['result_data']),
+                'result_data': row['result_data'] if legacy else None,
+                'completed_at': completed_at,
+            }
+            for row in rows
+        ])
+        # commit выполняет get_async_task_session
+
+
+async def write_result(row: dict):
+    """Запись одного результата отдельной транзакцией (запасной путь)."""
+    row['completed_at'] = datetime.datetime.utcnow()
+    async with get_async_task_session() as session:
+        hashes = await store_texts([row['result_data']] if row['result_data'] is not None else [], session)
+        stmt = update(PredictionTask).where(PredictionTask.id == row['task_id']).values(
+                status=row['status'],
+                result_hash=hashes.get(row['result_data']),
+                result_data=row['result_data'] if settings.TASK_TEXTS_LEGACY_COLUMNS else None,
+                completed_at=row['completed_at']
+            )
+        await session.execute(stmt)
+
+
+async def on_message_db_batch(messages: List[IncomingMessage]):
+    """
+    Записывает микро-батч результатов.
+
+    Сообщения подтверждаются только после коммита. Если батч не записался,
+    строки пишутся по одной: битые отклоняются, остальные подтверждаются,
+    а при недоступной базе сообщения возвращаются в очередь.
+    """
+    parsed = []
+    for message in messages:
+        try:
+            parsed.append((message, parse_result(message)))
+        except Exception as e:
+            print(f"[DB Worker] Некорректное сообщение результата: {e}")
+            await message.reject(requeue=False)
+
+    if not parsed:
+        return
+
+    print(f"[DB Worker] Получен батч из {len(parsed)} результатов")
+
+    # --- АСИНХРОННАЯ ЗАПИСЬ В БД ---
+    started = time.perf_counter()
+    try:
+        await write_results_bulk([row for _, row in parsed])
+    except Exception as e:
+        print(f"[DB Worker] Батч не записан ({e}), переходим к записи по одной")
+    else:
+        WRITE_SECONDS.labels("bulk").observe(time.perf_counter() - started)
+        WRITE_BATCH_ROWS.observe(len(parsed))
+        ROWS_WRITTEN.labels("bulk").inc(len(parsed))
+        for message, _ in parsed:
+            await message.ack()
+        print(f"[DB Worker] Успешно записано в БД {len(parsed)} результатов")
+        await notify_completed([row for _, row in parsed])
+        return
+
+    unavailable = []
+    written = []
+    for message, row in parsed:
+        started = time.perf_counter()
+        try:
+            await write_result(row)
+        except Exception as e:
+            print(f"[DB Worker] Ошибка записи результата {row['task_id']}: {e}")
+            if is_db_unavailable(e):
+                unavailable.append(message)
+            else:
+                await message.reject(requeue=False)
+            continue
+        WRITE_SECONDS.labels("single").observe(time.perf_counter() - started)
+        ROWS_WRITTEN.labels("single").inc()
+        await message.ack()
+        written.append(row)
+    await notify_completed(written)
+
+    if unavailable:
+        # База недоступна - вернем сообщения в очередь после паузы
+        await asyncio.sleep(DB_UNAVAILABLE_BACKOFF_S)
+        for message in unavailable:
+            await message.nack(requeue=True)
+
+
+async def main_db_worker(serve_metrics: bool = True):
     await get_database_engine()
-    connection = await connect_robust(BROKER_URL)
-    async with connection:
-        channel = await connection.channel()
-        queue = await channel.declare_queue(DB_QUEUE, durable=True)
-        await queue.consume(on_message_db_write)
+    batcher = MicroBatcher(
+        handler=on_message_db_batch,
+        max_batch_size=settings.DB_WRITE_BATCH_SIZE,
+        max_wait_s=settings.DB_WRITE_MAX_WAIT_MS / 1000,
+        name=DB_QUEUE,
+    )
+    metrics_server = await start_metrics_server(settings.METRICS_PORT) if serve_metrics else None
+    transport = await open_transport()
+    try:
+        # Один батч пишется, следующий копится в буфере
+        await transport.consume(DB_QUEUE, batcher.submit, prefetch=settings.DB_WRITE_BATCH_SIZE * 2)
         print("DB Worker запущен и ожидает сообщений в db_queue...")
-        await asyncio.Future()
+        await batcher.run()
+    finally:
+        await close_transport()
+        if metrics_server is not None:
+            metrics_server.close()
 
 if __name__ == "__main__":
-    asyncio.run(main_db_worker())
\ No newline at end of file
+    asyncio.run(main_db_worker())
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """
+    Выносит блокирующий инференс из event loop воркера.
+
+    thread  - один поток: event loop свободен для heartbeat, ack и publish,
+              модель в процессе одна.
+    process - max_workers процессов, у каждого свой пул из одного процесса
+              и своя копия модели; задачи выполняются параллельно. Модель
+              загружается в процесс прогревом (warm_up) или первым вызовом.
+
+    capacity - сколько вызовов выполняется одновременно; на нем строится
+    prefetch канала.
+
+    Сломанный исполнитель (процесс убит OOM killer'ом или упал в llama.cpp)
+    пересоздается; вызов, попавший на него, завершается BrokenExecutor.
+    """
+
+    def __init__(self, kind: str, max_workers: int):
+        kind = kind.lower()
+        if kind == "process":
+            self._capacity = max(max_workers, 1)
+        elif kind == "thread":
+            if max_workers > 1:
+                logger.warning("ML_EXECUTOR=thread использует один поток: модель не потокобезопасна")
+            self._capacity = 1
+        else:
+            raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.kind = kind
+        self._workers: List[Executor] = [self._create_worker() for _ in range(self._capacity)]
+        self._busy: Set[int] = set()
+        # Исполнитель, который ждет прогрев: новые вызовы на него не попадают
+        self._reserved: Optional[int] = None
+        self._changed: asyncio.Condition | None = None
+        self._warming: asyncio.Lock | None = None
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def _create_worker(self) -> Executor:
+        if self.kind == "process":
+            return ProcessPoolExecutor(
+                max_workers=1,
+                # fork после старта event loop и соединения с брокером небезопасен
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def _free_worker(self) -> Optional[int]:
+        for index in range(self._capacity):
+            if index not in self._busy and index != self._reserved:
+                return index
+        return None
+
+    async def _acquire(self, index: Optional[int] = None) -> int:
+        """Занимает исполнитель index или, если он не задан, любой свободный."""
+        changed = self._condition()
+        async with changed:
+            if index is None:
+                await changed.wait_for(lambda: self._free_worker() is not None)
+                index = self._free_worker()
+            else:
+                await changed.wait_for(lambda: index not in self._busy)
+            self._busy.add(index)
+        return index
+
+    async def _release(self, index: int) -> None:
+        changed = self._condition()
+        async with changed:
+            self._busy.discard(index)
+            changed.notify_all()
+
+    async def _call(self, index: int, fn: Callable[..., Any], *args: Any) -> Any:
+        worker = self._workers[index]
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(worker, fn, *args)
+        except BrokenExecutor:
+            logger.error(f"Исполнитель инференса {index} сломан, пересоздаем его")
+            self._workers[index] = self._create_worker()
+            worker.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет fn(*args) на свободном исполнителе, не больше capacity вызовов одновременно."""
+        index = await self._acquire()
+        try:
+            return await self._call(index, fn, *args)
+        finally:
+            await self._release(index)
+
+    async def warm_up(self, fn: Callable[..., Any], *args: Any) -> None:
+        """
+        Выполняет fn(*args) так, чтобы эффект получили все исполнители.
+
+        thread  - в отдельном потоке, модель в процессе общая: слот
+                  инференса не занимается;
+        process - на каждом процессе по очереди: прогрев занимает один
+                  процесс за раз, остальные продолжают инференс.
+        """
+        if self.kind == "thread":
+            await asyncio.to_thread(fn, *args)
+            return
+
+        if self._warming is None:
+            self._warming = asyncio.Lock()
+        async with self._warming:
+            for index in range(self._capacity):
+                self._reserved = index
+                try:
+                    await self._acquire(index)
+                finally:
+                    self._reserved = None
+                try:
+                    await self._call(index, fn, *args)
+                finally:
+                    await self._release(index)
+
+    def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.shutdown(wait=True, cancel_futures=True)
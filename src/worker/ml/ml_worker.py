@@ -1,78 +1,354 @@
 import asyncio
-import json
 import logging
-from aio_pika import connect_robust, IncomingMessage, Message, DeliveryMode
+import os
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+from aio_pika import IncomingMessage
 
-from config.app_config import Settings, DB_QUEUE, TASK_QUEUE
-from worker.ml.model_loader import cached_generate_response
+from app.infrastructure.models.prediction_task import TaskStatus
+from broker import envelope
+from broker.stream import publish_stream_event, TOKEN_EVENT
+from broker.transport import open_transport, close_transport, get_transport
+from config.app_config import Settings, DB_QUEUE, LEGACY_TASK_QUEUE, TASK_QUEUE
+from database.database import get_database_engine
+from worker.batching import MicroBatcher
+from worker.scheduling import FairScheduler
+from worker.ml.executor import InferenceExecutor
+from worker.ml.model_loader import generate_responses, result_cache_key
+from worker.ml.model_registry import ModelRegistry
+from worker.ml.result_cache import CacheStats
+from worker.ml.single_flight import SingleFlight
+from metrics.registry import REGISTRY
+from metrics.server import start_metrics_server
 
 logger = logging.getLogger(__name__)
 
 settings = Settings()
-BROKER_URL = settings.RABBITMQ_URL
+
+# Пул, в котором выполняется инференс; создается в main_ml_worker
+executor: InferenceExecutor | None = None
+# Активная модель по таблице ml_models; создается в main_ml_worker
+registry: ModelRegistry | None = None
+# Попадания в кэш результатов по всем процессам инференса
+cache_stats = CacheStats()
+# Задачи, чей ключ кэша результатов уже генерируется: ждут результата ведущей задачи
+in_flight = SingleFlight()
+
+PREFILL_SECONDS = REGISTRY.histogram(
+    "ml_prefill_seconds", "Prompt processing time until the first token",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DECODE_SECONDS = REGISTRY.histogram(
+    "ml_decode_seconds", "Time from the first to the last generated token",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+TOKENS_PER_SECOND = REGISTRY.histogram(
+    "ml_decode_tokens_per_second", "Decode throughput per generation",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+GENERATED_TOKENS = REGISTRY.counter("ml_generated_tokens_total", "Completion tokens generated")
+RESULT_CACHE_LOOKUPS = REGISTRY.counter(
+    "ml_result_cache_lookups_total", "Result cache lookups by outcome (memory, disk, miss)", ("tier",)
+)
+RESULT_CACHE_HIT_RATIO = REGISTRY.gauge("ml_result_cache_hit_ratio", "Result cache hit ratio since start")
+TASKS_FINISHED = REGISTRY.counter("ml_tasks_finished_total", "Prediction tasks finished by status", ("status",))
+COALESCED_TASKS = REGISTRY.counter(
+    "ml_coalesced_tasks_total", "Tasks served by an in-flight generation of the same prompt"
+)
 
 async def publish_result(queue_name: str, payload: dict):
     """Вспомогательная функция для публикации сообщений."""
-    connection = await connect_robust(BROKER_URL)
-    async with connection:
-        channel = await connection.channel()
-        await channel.default_exchange.publish(
-            Message(
-                body=json.dumps(payload, ensure_ascii=False).encode(),
-                delivery_mode=DeliveryMode.PERSISTENT
-            ),
-            routing_key=queue_name
-        )
-
-
-async def on_message_ml_task(message: IncomingMessage):
-    async with message.process():
+    await get_transport().publish(queue_name, envelope.encode(payload))
+
+
+def parse_task(message: IncomingMessage) -> Tuple[str, str]:
+    """Идентификатор задачи и промпт из сообщения task_queue."""
+    data = envelope.decode(message.body)
+    input_data = data.get("data", "")
+    return data['task_id'], input_data if isinstance(input_data, str) else str(input_data)
+
+
+def coalescing_submit(batcher: MicroBatcher) -> Callable[[IncomingMessage], Awaitable[None]]:
+    """
+    Колбэк потребления task_queue: задача, чей промпт на активной модели
+    уже генерируется, не занимает места в батче, а присоединяется к
+    ведущей задаче и получает ее результат.
+
+    К задачам, которые еще ждут в буфере, новая не присоединяется: она
+    проходит планировщик со своим приоритетом, а объединение случится при
+    старте батча (on_message_ml_batch), если ее ключ к тому времени уже
+    генерируется.
+    """
+    async def submit(message: IncomingMessage) -> None:
+        try:
+            task_id, prompt = parse_task(message)
+        except Exception:
+            # Некорректное сообщение отклонит обработчик батча
+            await batcher.submit(message)
+            return
+        if in_flight.follow(result_cache_key(prompt, registry.active), (message, task_id)):
+            COALESCED_TASKS.inc()
+            return
+        await batcher.submit(message)
+
+    return submit
+
+
+def task_schedule_key(message: IncomingMessage) -> Tuple[int, Hashable]:
+    """Класс приоритета из priority сообщения, поток - пользователь задачи."""
+    try:
+        user_id = envelope.decode(message.body).get("user_id")
+    except envelope.EnvelopeError:
+        # Битое сообщение отклонит обработчик батча
+        user_id = None
+    return message.priority or 0, user_id
+
+
+def create_task_batcher(capacity: int) -> MicroBatcher:
+    """Батчер задач с честным планировщиком: пользователи делят воркер поровну."""
+    return MicroBatcher(
+        handler=on_message_ml_batch,
+        max_batch_size=settings.ML_BATCH_SIZE,
+        max_wait_s=settings.ML_BATCH_MAX_WAIT_MS / 1000,
+        max_concurrent_batches=capacity,
+        name=TASK_QUEUE,
+        queue=FairScheduler(task_schedule_key),
+    )
+
+
+def task_prefetch(capacity: int) -> int:
+    """
+    Сколько задач одна реплика держит неподтвержденными: полные батчи на
+    каждый слот пула и окно планировщика сверх них.
+
+    Окно небольшое: остальные задачи ждут в брокере, где их упорядочивает
+    приоритет очереди и откуда их забирает освободившаяся реплика, а не та,
+    что успела набрать их в свой буфер.
+    """
+    return capacity * settings.ML_BATCH_SIZE + settings.ML_SCHEDULER_WINDOW
+
+
+async def relay_tokens(chunks: asyncio.Queue, prompt_tasks: Dict[str, List[str]]):
+    """
+    Пересылает фрагменты генерации из потока инференса в потоки задач.
+
+    Все фрагменты, накопившиеся к моменту чтения, склеиваются в одно
+    сообщение, чтобы не публиковать каждый токен отдельно. None - конец.
+    """
+    finished = False
+    while not finished:
+        pending: Dict[str, List[str]] = {}
+        item = await chunks.get()
+        while True:
+            if item is None:
+                finished = True
+                break
+            prompt, text = item
+            pending.setdefault(prompt, []).append(text)
+            try:
+                item = chunks.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+        for prompt, parts in pending.items():
+            for task_id in prompt_tasks.get(prompt, []):
+                try:
+                    await publish_stream_event(task_id, TOKEN_EVENT, text="".join(parts))
+                except Exception as e:
+                    logger.warning(f"Не удалось опубликовать токены задачи {task_id}: {e}")
+
+
+async def on_message_ml_batch(messages: List[IncomingMessage]):
+    """
+    Обрабатывает микро-батч задач ML.
+
+    Каждое сообщение подтверждается только после публикации его результата
+    в очередь записи в БД.
+    """
+    # Модель фиксируется на весь батч: подмена активной модели его не затронет
+    spec = registry.active
+    tasks = []
+    for message in messages:
         try:
-            data = json.loads(message.body.decode())
-            task_id = data['task_id']
-            input_data = data.get("data", "")
+            task_id, prompt = parse_task(message)
+        except Exception as e:
+            logger.exception(f"Некорректное сообщение задачи: {e}")
+            await message.reject(requeue=False)
+            continue
+        # Ключ уже генерируется (другой батч или эта же пачка) - задача становится ведомой
+        key = result_cache_key(prompt, spec)
+        if in_flight.join(key, (message, task_id)):
+            COALESCED_TASKS.inc()
+            continue
+        # Генерация через GGUF + llama.cpp
+        tasks.append((message, task_id, prompt, key))
+
+    if not tasks:
+        return
 
-            logger.info(f"Обработка задачи ML: {task_id}")
+    logger.info(f"Обработка батча ML из {len(tasks)} задач на модели {spec.name} ({spec.version})")
+    prompts = [prompt for _, _, prompt, _ in tasks]
 
-            # Генерация через GGUF + llama.cpp
-            prompt = input_data if isinstance(input_data, str) else str(input_data)
-            prediction_result = cached_generate_response(prompt)
+    # Потоковая отдача токенов возможна только из потока этого же процесса
+    on_token = None
+    relay = None
+    if settings.ML_STREAM_TOKENS and executor.kind == "thread":
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        prompt_tasks: Dict[str, List[str]] = {}
+        for _, task_id, prompt, key in tasks:
+            # Ведомые, присоединившиеся до начала генерации, получают токены вместе с ведущей
+            prompt_tasks[prompt] = [follower_id for _, follower_id in in_flight.followers(key)]
+            prompt_tasks[prompt].append(task_id)
+        relay = asyncio.create_task(relay_tokens(chunks, prompt_tasks))
 
+        def push_chunk(prompt: str, text: str):
+            loop.call_soon_threadsafe(chunks.put_nowait, (prompt, text))
+
+        on_token = push_chunk
+
+    # Генерация идет в пуле, event loop продолжает обслуживать ack/publish
+    try:
+        results = await executor.run(generate_responses, prompts, on_token, spec)
+    except Exception:
+        # Батч целиком возвращается в очередь: и ведущие, и ведомые, которые ждут их результата
+        for message, _, _, key in tasks:
+            await message.nack(requeue=True)
+            for follower, _ in in_flight.release(key):
+                await follower.nack(requeue=True)
+        raise
+    finally:
+        if relay is not None:
+            # Все фрагменты уже в очереди: колбэки потока выполнены раньше результата
+            chunks.put_nowait(None)
+            await relay
+    for result in results:
+        if result.error is None:
+            cache_stats.record(result.cache_tier)
+            RESULT_CACHE_LOOKUPS.labels(result.cache_tier or "miss").inc()
+        if result.timings is not None:
+            PREFILL_SECONDS.observe(result.timings.prefill_s)
+            DECODE_SECONDS.observe(result.timings.decode_s)
+            TOKENS_PER_SECOND.observe(result.timings.tokens_per_s)
+            GENERATED_TOKENS.inc(result.timings.completion_tokens)
+    RESULT_CACHE_HIT_RATIO.set(cache_stats.hit_ratio)
+    logger.info(
+        f"Кэш результатов: memory={cache_stats.memory_hits} disk={cache_stats.disk_hits} "
+        f"miss={cache_stats.misses} hit_ratio={cache_stats.hit_ratio:.2f}"
+    )
+
+    # Ведомые получают результат своей ведущей; задачи с тем же ключом,
+    # пришедшие после этой точки, попадут в кэш результатов
+    deliveries = []
+    for (message, task_id, _, key), result in zip(tasks, results):
+        deliveries.append((message, task_id, result, True))
+        for follower, follower_id in in_flight.release(key):
+            deliveries.append((follower, follower_id, result, False))
+
+    for message, task_id, result, generated in deliveries:
+        if result.error is None:
+            result_payload = {
+                'task_id': task_id,
+                'status': TaskStatus.COMPLETED.value,
+                'result': result.text
+            }
+            if generated and result.timings is not None:
+                result_payload['timings'] = {
+                    'prefill_s': round(result.timings.prefill_s, 4),
+                    'decode_s': round(result.timings.decode_s, 4),
+                    'completion_tokens': result.timings.completion_tokens,
+                }
+                logger.info(
+                    f"Задача {task_id}: prefill={result.timings.prefill_s:.3f}s "
+                    f"decode={result.timings.decode_s:.3f}s "
+                    f"({result.timings.tokens_per_s:.1f} tok/s)"
+                )
+        else:
             result_payload = {
                 'task_id': task_id,
-                'result': prediction_result
+                'status': TaskStatus.FAILED.value,
+                'result': None
             }
 
-            # --- ОТПРАВКА В ОЧЕРЕДИ ---
-            # 1. Отправляем в очередь для записи в БД
+        try:
+            # --- ОТПРАВКА В ОЧЕРЕДЬ ---
+            # Итог клиентам SSE отдает API по событию завершения DB воркера, после коммита
             await publish_result(DB_QUEUE, result_payload)
-            logger.info(f"Задача {task_id} завершена")
+        except Exception as e:
+            # Результат не доставлен - возвращаем задачу в очередь
+            logger.exception(f"Не удалось опубликовать результат задачи {task_id}: {e}")
+            await message.nack(requeue=True)
+            continue
 
-            # 2. Отправляем в очередь для ответа/уведомления клиента
-            # await publish_result(RESULT_QUEUE, result_payload)
+        await message.ack()
+        TASKS_FINISHED.labels(result_payload['status']).inc()
+        logger.info(f"Задача {task_id} завершена со статусом {result_payload['status']}")
 
-        except Exception as e:
-            logger.exception(f"Ошибка в задаче: {e}")
-            raise
 
+def _mark_ready(ready: bool):
+    """Файл готовности: есть только пока модель прогрета и воркер потребляет задачи."""
+    if ready:
+        with open(settings.ML_READY_FILE, "w") as f:
+            f.write(str(os.getpid()))
+    elif os.path.exists(settings.ML_READY_FILE):
+        os.remove(settings.ML_READY_FILE)
+
+
+async def main_ml_worker(serve_metrics: bool = True):
+    """
+    Запускает ML воркер. serve_metrics=False - когда воркер делит процесс
+    с API (standalone), и метрики отдает эндпоинт /metrics самого API.
+    """
+    global executor, registry
+    _mark_ready(False)
+    phases = {}
+    started = time.perf_counter()
+
+    phase_started = time.perf_counter()
+    await get_database_engine()
+    executor = InferenceExecutor(
+        kind=settings.ML_EXECUTOR,
+        max_workers=settings.ML_EXECUTOR_WORKERS,
+    )
+    registry = ModelRegistry(executor, poll_interval_s=settings.ML_MODEL_POLL_S)
+    phases["init"] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    spec = await registry.resolve()
+    phases["resolve_model"] = time.perf_counter() - phase_started
+
+    # Загружаем и прогреваем активную модель заранее, до начала потребления задач
+    phase_started = time.perf_counter()
+    await registry.start(spec)
+    phases["load_and_warm_up"] = time.perf_counter() - phase_started
 
-async def main_ml_worker():
-    from worker.ml.model_loader import load_model
-    load_model()
+    batcher = create_task_batcher(executor.capacity)
+    metrics_server = await start_metrics_server(settings.METRICS_PORT) if serve_metrics else None
 
-    connection = await connect_robust(BROKER_URL)
-    async with connection:
-        channel = await connection.channel()
-        # Объявляем очереди на случай, если их еще нет
-        await channel.declare_queue(DB_QUEUE, durable=True)
-        # await channel.declare_queue(RESULT_QUEUE, durable=True)
+    phase_started = time.perf_counter()
+    transport = await open_transport()
+    try:
+        # Окно prefetch - буфер планировщика: в его пределах задачи упорядочиваются по пользователям
+        submit = coalescing_submit(batcher)
+        await transport.consume(TASK_QUEUE, submit, prefetch=task_prefetch(executor.capacity))
+        # Задачи, опубликованные в прежнюю очередь до выкатки, идут через тот же планировщик
+        await transport.consume(LEGACY_TASK_QUEUE, submit, prefetch=task_prefetch(executor.capacity))
+        phases["broker"] = time.perf_counter() - phase_started
 
-        task_queue = await channel.declare_queue(TASK_QUEUE, durable=True)
-        await task_queue.consume(on_message_ml_task)
-        logger.info("ML Worker запущен и ожидает задач в task_queue...")
-        await asyncio.Future()
+        _mark_ready(True)
+        breakdown = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in phases.items())
+        logger.info(f"Холодный старт за {time.perf_counter() - started:.2f}s: {breakdown}")
+        logger.info(f"ML Worker запущен и ожидает задач в {TASK_QUEUE}...")
+        await batcher.run()
+    finally:
+        _mark_ready(False)
+        await registry.stop()
+        executor.shutdown()
+        await close_transport()
+        if metrics_server is not None:
+            metrics_server.close()
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(main_ml_worker())
\ No newline at end of file
+    asyncio.run(main_ml_worker())
@@ -1,59 +1,360 @@
-from llama_cpp import Llama
-from functools import lru_cache
+from llama_cpp import Llama, LlamaRAMCache, LlamaDiskCache
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Tuple
+import logging
 import os
+import threading
+import time
 from huggingface_hub import utils, hf_hub_download
 
-utils.logging.set_verbosity_info()
-utils.logging.set_verbosity_debug()
+from config.app_config import Settings
+from worker.ml.result_cache import ResultCache, build_result_cache, make_cache_key
 
-_model = None
+if Settings().ML_HF_DEBUG:
+    utils.logging.set_verbosity_debug()
+
+logger = logging.getLogger(__name__)
+
+_result_cache: Optional[ResultCache] = None
+_default_spec: Optional["ModelSpec"] = None
 # Параметры репозитория HF
 REPO_ID = "TheBloke/TinyLlama-1.1B-Chat-v1.0-GGUF"
 FILENAME = "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
 
-def load_model():
-    global _model
-    if _model is not None:
-        return
+# Параметры генерации; входят в ключ кэша результатов
+GENERATION_PARAMS = {
+    "max_tokens": 128,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "stop": ["<|end|>"],
+}
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Какую модель использовать: передается в пул инференса вместе с батчем."""
+    name: str
+    file_path: str
+    version: str
+
+    @property
+    def cache_id(self) -> str:
+        return f"{self.file_path}@{self.version}"
+
+
+def default_model_spec() -> ModelSpec:
+    """
+    Модель по умолчанию, если в таблице ml_models нет активной записи.
+
+    Порядок поиска без сети: явный ML_MODEL_PATH, затем уже скачанный файл
+    в кэше HF. Скачивание с хаба - только если не включен ML_MODEL_OFFLINE.
+    """
+    global _default_spec
+    if _default_spec is not None:
+        return _default_spec
+
+    settings = Settings()
+    if settings.ML_MODEL_PATH:
+        model_path = os.path.expanduser(settings.ML_MODEL_PATH)
+        if not os.path.isfile(model_path):
+            raise RuntimeError(f"ML_MODEL_PATH does not exist: {model_path}")
+        _default_spec = ModelSpec(name=os.path.basename(model_path), file_path=model_path, version="local")
+        return _default_spec
 
     try:
-        model_path = hf_hub_download(
-            repo_id=REPO_ID,
-            filename=FILENAME,
-        )
-        print(f"Model successfully retrieved/downloaded to: {model_path}")
+        model_path = hf_hub_download(repo_id=REPO_ID, filename=FILENAME, local_files_only=True)
+        print(f"Model found in local cache: {model_path}")
     except Exception as e:
-        print(f"Error downloading model: {e}")
-        raise RuntimeError("Failed to load model from Hugging Face.")
+        if settings.ML_MODEL_OFFLINE:
+            print(f"Model is not in local cache and ML_MODEL_OFFLINE is set: {e}")
+            raise RuntimeError("Model not available offline.")
+        try:
+            model_path = hf_hub_download(
+                repo_id=REPO_ID,
+                filename=FILENAME,
+            )
+            print(f"Model successfully retrieved/downloaded to: {model_path}")
+        except Exception as e:
+            print(f"Error downloading model: {e}")
+            raise RuntimeError("Failed to load model from Hugging Face.")
+
+    _default_spec = ModelSpec(name=REPO_ID, file_path=model_path, version=FILENAME)
+    return _default_spec
 
-    _model = Llama(
+
+def create_llama(model_path: str) -> Llama:
+    """Открывает GGUF через mmap: веса подгружаются страницами и делятся между процессами."""
+    model = Llama(
         model_path=model_path,
         n_ctx=2048,          # максимальный контекст
         n_threads=2,         # количество CPU-потоков
         n_gpu_layers=0,      # 0 = только CPU
+        use_mmap=True,
         verbose=False
     )
+    attach_prompt_cache(model)
+    return model
+
+
+def attach_prompt_cache(model: Llama) -> None:
+    """
+    Подключает кэш состояния промпта (KV) llama.cpp.
+
+    Общий префикс (шаблон чата, системный промпт) вычисляется один раз:
+    при следующем запросе восстанавливается состояние с самым длинным
+    совпадающим префиксом токенов.
+    """
+    settings = Settings()
+    kind = settings.ML_PROMPT_CACHE.lower()
+    capacity_bytes = settings.ML_PROMPT_CACHE_MB * 1024 * 1024
+    if kind == "none":
+        return
+    if kind == "ram":
+        model.set_cache(LlamaRAMCache(capacity_bytes=capacity_bytes))
+    elif kind == "disk":
+        model.set_cache(LlamaDiskCache(cache_dir=settings.ML_PROMPT_CACHE_DIR, capacity_bytes=capacity_bytes))
+    else:
+        raise ValueError(f"Unknown ML_PROMPT_CACHE: {settings.ML_PROMPT_CACHE}")
+    logger.info(f"Prompt cache enabled: {kind}, {settings.ML_PROMPT_CACHE_MB} MB")
+
+
+@dataclass
+class ResidentModel:
+    llm: Llama
+    size_bytes: int
+    pins: int = 0
+
+
+@dataclass
+class ResidentModels:
+    """
+    Модели, загруженные в этом процессе, с LRU-вытеснением по бюджету памяти.
+
+    Модель, которой пользуется батч, закреплена (pins > 0) и не вытесняется,
+    поэтому переключение активной модели не обрывает задачи в работе.
+    Ключ - путь и версия (ModelSpec.cache_id): новая версия, выложенная
+    поверх прежнего файла, загружается заново, а не подменяется старыми весами.
+    """
+    budget_bytes: int
+    _models: "OrderedDict[str, ResidentModel]" = field(default_factory=OrderedDict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _loading: dict = field(default_factory=dict)
+
+    def _pin(self, key: str) -> Optional[Llama]:
+        entry = self._models.get(key)
+        if entry is None:
+            return None
+        entry.pins += 1
+        self._models.move_to_end(key)
+        return entry.llm
+
+    def is_resident(self, spec: ModelSpec) -> bool:
+        with self._lock:
+            return spec.cache_id in self._models
+
+    def acquire(self, spec: ModelSpec) -> Llama:
+        with self._lock:
+            llm = self._pin(spec.cache_id)
+            if llm is not None:
+                return llm
+            load_lock = self._loading.setdefault(spec.cache_id, threading.Lock())
+
+        # Загрузка идет вне общего замка: другие модели продолжают обслуживать батчи
+        with load_lock:
+            with self._lock:
+                llm = self._pin(spec.cache_id)
+                if llm is not None:
+                    return llm
+
+            started = time.perf_counter()
+            llm = create_llama(spec.file_path)
+            size_bytes = os.path.getsize(spec.file_path)
+            logger.info(f"Model {spec.name} ({spec.version}) loaded in {time.perf_counter() - started:.2f}s")
+
+            with self._lock:
+                self._models[spec.cache_id] = ResidentModel(llm=llm, size_bytes=size_bytes, pins=1)
+                self._loading.pop(spec.cache_id, None)
+                self._evict_locked()
+            return llm
 
+    def release(self, spec: ModelSpec) -> None:
+        with self._lock:
+            entry = self._models.get(spec.cache_id)
+            if entry is not None:
+                entry.pins -= 1
+            self._evict_locked()
 
-def generate_response(prompt: str) -> str:
-    if _model is None:
-        load_model()
+    @contextmanager
+    def use(self, spec: ModelSpec) -> Iterator[Llama]:
+        llm = self.acquire(spec)
+        try:
+            yield llm
+        finally:
+            self.release(spec)
 
+    def _evict_locked(self) -> None:
+        total = sum(entry.size_bytes for entry in self._models.values())
+        for key in list(self._models):
+            if total <= self.budget_bytes:
+                return
+            entry = self._models[key]
+            if entry.pins > 0:
+                continue
+            del self._models[key]
+            total -= entry.size_bytes
+            if hasattr(entry.llm, "close"):
+                entry.llm.close()
+            logger.info(f"Model {key} evicted from memory")
+        if total > self.budget_bytes:
+            logger.warning("Resident models exceed ML_MODEL_MEMORY_MB: all of them are in use")
+
+
+resident_models = ResidentModels(budget_bytes=Settings().ML_MODEL_MEMORY_MB * 1024 * 1024)
+
+
+def load_model(spec: Optional[ModelSpec] = None) -> None:
+    """Загружает модель (по умолчанию - из HF) в память процесса."""
+    spec = spec or default_model_spec()
+    with resident_models.use(spec):
+        pass
+
+
+def warm_up_model(spec: ModelSpec) -> None:
+    """Загружает модель и прогоняет короткую генерацию, чтобы подтянуть страницы весов."""
+    if resident_models.is_resident(spec):
+        # Уже загружена и, возможно, прямо сейчас генерирует - Llama не потокобезопасна
+        return
+    with resident_models.use(spec) as llm:
+        llm.create_chat_completion(messages=[{"role": "user", "content": "Hi"}], max_tokens=1)
+
+
+# Колбэк потоковой генерации: (промпт, очередной фрагмент текста)
+TokenCallback = Callable[[str, str], None]
+
+
+@dataclass
+class GenerationTimings:
+    """
+    Время генерации одного промпта.
+
+    prefill_s - от вызова до первого токена (обработка промпта),
+    decode_s - от первого до последнего токена.
+    """
+    prefill_s: float = 0.0
+    decode_s: float = 0.0
+    completion_tokens: int = 0
+
+    @property
+    def tokens_per_s(self) -> float:
+        return self.completion_tokens / self.decode_s if self.decode_s > 0 else 0.0
+
+
+def _generate(llm: Llama, prompt: str, on_token: Optional[TokenCallback] = None) -> Tuple[str, GenerationTimings]:
     messages = [
         {"role": "user", "content": prompt}
     ]
 
-    response = _model.create_chat_completion(
-        messages=messages,
-        max_tokens=128,
-        temperature=0.7,
-        top_p=0.95,
-        stop=["<|end|>"]
+    # Генерируем потоком, чтобы отделить время префилла от декодирования
+    parts = []
+    started = time.perf_counter()
+    first_token_at = None
+    for chunk in llm.create_chat_completion(messages=messages, stream=True, **GENERATION_PARAMS):
+        text = chunk["choices"][0]["delta"].get("content")
+        if not text:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        parts.append(text)
+        if on_token is not None:
+            on_token(prompt, text)
+    finished = time.perf_counter()
+
+    first_token_at = first_token_at or finished
+    timings = GenerationTimings(
+        prefill_s=first_token_at - started,
+        decode_s=finished - first_token_at,
+        completion_tokens=len(parts),
     )
+    return "".join(parts).strip(), timings
+
+
+def generate_response(prompt: str, on_token: Optional[TokenCallback] = None, spec: Optional[ModelSpec] = None) -> str:
+    spec = spec or default_model_spec()
+    with resident_models.use(spec) as llm:
+        text, _ = _generate(llm, prompt, on_token)
+    return text
+
+
+def get_result_cache() -> ResultCache:
+    """Кэш результатов процесса (создается лениво, в том числе в процессах пула)."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = build_result_cache(Settings())
+    return _result_cache
+
+
+def result_cache_key(prompt: str, spec: ModelSpec) -> str:
+    return make_cache_key(prompt, spec.cache_id, GENERATION_PARAMS)
+
+
+def cached_generate_response(prompt: str, spec: Optional[ModelSpec] = None) -> str:
+    spec = spec or default_model_spec()
+    cache = get_result_cache()
+    key = result_cache_key(prompt, spec)
+    value, _ = cache.lookup(key)
+    if value is not None:
+        return value
+    value = generate_response(prompt, spec=spec)
+    cache.set(key, value)
+    return value
+
+
+@dataclass
+class GenerationResult:
+    """Результат генерации для одного промпта из батча."""
+    text: Optional[str] = None
+    error: Optional[str] = None
+    cache_tier: Optional[str] = None  # memory | disk, если ответ взят из кэша
+    timings: Optional[GenerationTimings] = None  # None для ответов из кэша
+
 
-    return response["choices"][0]["message"]["content"].strip()
+def generate_responses(
+        prompts: List[str],
+        on_token: Optional[TokenCallback] = None,
+        spec: Optional[ModelSpec] = None
+) -> List[GenerationResult]:
+    """
+    Генерирует ответы для списка промптов по очереди на одном экземпляре Llama.
 
+    Это не пакетное декодирование: высокоуровневый API llama-cpp-python
+    ведет одну последовательность, и промпты декодируются друг за другом.
+    Общий вызов экономит только накладные расходы на промпт: закрепление
+    модели, поиск в кэше результатов, повторные промпты генерируются один
+    раз. Ошибка на одном промпте не роняет остальные: она возвращается в
+    поле error. Если задан on_token, фрагменты сгенерированного текста
+    передаются в него по мере декодирования. Модель spec закреплена на
+    время всего вызова.
+    """
+    spec = spec or default_model_spec()
+    cache = get_result_cache()
+    unique: dict[str, GenerationResult] = {}
+    with resident_models.use(spec) as llm:
+        for prompt in prompts:
+            if prompt in unique:
+                continue
+            key = result_cache_key(prompt, spec)
+            try:
+                value, tier = cache.lookup(key)
+                if value is not None:
+                    unique[prompt] = GenerationResult(text=value, cache_tier=tier)
+                    continue
+                value, timings = _generate(llm, prompt, on_token)
+                cache.set(key, value)
+                unique[prompt] = GenerationResult(text=value, timings=timings)
+            except Exception as e:
+                logger.exception("Ошибка генерации ответа")
+                unique[prompt] = GenerationResult(error=str(e))
 
-@lru_cache(maxsize=128)
-def cached_generate_response(prompt: str) -> str:
-    return generate_response(prompt)
\ No newline at end of file
+    return [unique[prompt] for prompt in prompts]
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+from sqlmodel import select
+
+from app.infrastructure.models.ml_model import MLModel
+from database.database import get_async_task_session
+from worker.ml.executor import InferenceExecutor
+from worker.ml.model_loader import ModelSpec, default_model_spec, warm_up_model
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Активная модель воркера по данным таблицы ml_models.
+
+    Новая активная модель сначала загружается и прогревается в фоне, затем
+    ссылка на нее атомарно подменяется. Батч захватывает спецификацию модели
+    в момент старта, поэтому задачи в работе доезжают на прежней модели.
+    """
+
+    def __init__(self, executor: InferenceExecutor, poll_interval_s: float):
+        self._executor = executor
+        self._poll_interval_s = poll_interval_s
+        self._active: Optional[ModelSpec] = None
+        self._poller: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> ModelSpec:
+        if self._active is None:
+            raise RuntimeError("Model registry is not started")
+        return self._active
+
+    async def _load_active_spec(self) -> Optional[ModelSpec]:
+        async with get_async_task_session() as session:
+            statement = (
+                select(MLModel)
+                .where(MLModel.active == True)  # noqa: E712
+                .order_by(MLModel.created_at.desc())
+                .limit(1)
+            )
+            result = await session.execute(statement)
+            model = result.scalars().first()
+        if model is None:
+            return None
+        return ModelSpec(name=model.name, file_path=os.path.expanduser(model.file_path), version=model.version)
+
+    async def resolve(self) -> ModelSpec:
+        """Какая модель должна быть активной сейчас."""
+        spec = await self._load_active_spec()
+        if spec is None:
+            # Активной записи нет - работаем на модели по умолчанию
+            spec = await asyncio.to_thread(default_model_spec)
+        return spec
+
+    async def start(self, spec: Optional[ModelSpec] = None) -> None:
+        """Загружает и прогревает активную модель, затем запускает опрос таблицы."""
+        spec = spec or await self.resolve()
+        await self._executor.warm_up(warm_up_model, spec)
+        self._active = spec
+        logger.info(f"Active model: {spec.name} ({spec.version})")
+        self._poller = asyncio.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval_s)
+            try:
+                spec = await self.resolve()
+                if spec == self._active:
+                    continue
+                logger.info(f"Warming up model {spec.name} ({spec.version}) before swap")
+                await self._executor.warm_up(warm_up_model, spec)
+                previous, self._active = self._active, spec
+                logger.info(f"Active model swapped: {previous.name} ({previous.version}) -> {spec.name} ({spec.version})")
+            except Exception as e:
+                logger.exception(f"Model registry refresh failed: {e}")
+
+    async def stop(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
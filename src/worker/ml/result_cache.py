@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MEMORY_TIER = "memory"
+DISK_TIER = "disk"
+
+
+def make_cache_key(prompt: str, model_file: str, params: dict[str, Any]) -> str:
+    """Ключ кэша: sha256 от промпта, файла модели и параметров генерации."""
+    raw = json.dumps(
+        {"prompt": prompt, "model": model_file, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Счетчики попаданий по уровням кэша."""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    def record(self, tier: Optional[str]) -> None:
+        if tier == MEMORY_TIER:
+            self.memory_hits += 1
+        elif tier == DISK_TIER:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+
+class ResultCache(ABC):
+    """Базовый интерфейс кэша результатов: get возвращает (значение, уровень)."""
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        ...
+
+    def lookup(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        """get с учетом статистики."""
+        value, tier = self.get(key)
+        self.stats.record(tier)
+        return value, tier
+
+
+class NullResultCache(ResultCache):
+    """Кэш отключен."""
+
+    def get(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        return None, None
+
+    def set(self, key: str, value: str) -> None:
+        pass
+
+
+class MemoryResultCache(ResultCache):
+    """In-memory LRU в пределах процесса."""
+
+    def __init__(self, max_items: int = 128):
+        super().__init__()
+        self._max_items = max_items
+        self._items: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                return None, None
+            self._items.move_to_end(key)
+            return value, MEMORY_TIER
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_items:
+                self._items.popitem(last=False)
+
+
+class SQLiteResultCache(ResultCache):
+    """
+    Дисковый кэш в SQLite (WAL) на общем томе.
+
+    Файл разделяют все реплики ML воркера на хосте и он переживает
+    перезапуск. Записи старше ttl_s не возвращаются; при превышении
+    max_bytes удаляются давно не читанные записи.
+    """
+
+    # Как часто (в записях) проверять лимиты, чтобы не считать размер на каждом set
+    EVICT_EVERY = 64
+
+    def __init__(self, path: str, ttl_s: float, max_bytes: int):
+        super().__init__()
+        self._path = path
+        self._ttl_s = ttl_s
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_results_accessed_at ON results (accessed_at)")
+
+    def get(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM results WHERE key = ? AND created_at >= ?",
+                    (key, now - self._ttl_s),
+                ).fetchone()
+                if row is None:
+                    return None, None
+                self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                # Недоступный диск не должен ронять генерацию - считаем промахом
+                logger.warning(f"Result cache read failed: {e}")
+                return None, None
+            return row[0], DISK_TIER
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode()), now, now),
+                )
+                self._writes += 1
+                if self._writes % self.EVICT_EVERY == 0:
+                    self._evict(now)
+            except sqlite3.Error as e:
+                logger.warning(f"Result cache write failed: {e}")
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self._ttl_s,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+
+        # Удаляем самые давно читанные записи, пока не уложимся в лимит
+        excess = total - self._max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM results WHERE key = ?", victims)
+        logger.info(f"Result cache evicted {len(victims)} entries ({freed} bytes)")
+
+
+class TieredResultCache(ResultCache):
+    """Память процесса поверх общего дискового кэша."""
+
+    def __init__(self, memory: MemoryResultCache, disk: SQLiteResultCache):
+        super().__init__()
+        self._memory = memory
+        self._disk = disk
+
+    def get(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        value, tier = self._memory.get(key)
+        if value is not None:
+            return value, tier
+        value, tier = self._disk.get(key)
+        if value is not None:
+            self._memory.set(key, value)
+        return value, tier
+
+    def set(self, key: str, value: str) -> None:
+        self._memory.set(key, value)
+        self._disk.set(key, value)
+
+
+def build_result_cache(settings) -> ResultCache:
+    """Создает кэш по настройкам ML_CACHE_*."""
+    backend = settings.ML_CACHE_BACKEND.lower()
+    if backend == "none":
+        return NullResultCache()
+
+    memory = MemoryResultCache(max_items=settings.ML_CACHE_MEMORY_ITEMS)
+    if backend == "memory":
+        return memory
+    if backend == "tiered":
+        try:
+            disk = SQLiteResultCache(
+                path=settings.ML_CACHE_PATH,
+                ttl_s=settings.ML_CACHE_TTL_S,
+                max_bytes=settings.ML_CACHE_MAX_MB * 1024 * 1024,
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Disk result cache unavailable, falling back to memory: {e}")
+            return memory
+        return TieredResultCache(memory, disk)
+    raise ValueError(f"Unknown ML_CACHE_BACKEND: {settings.ML_CACHE_BACKEND}")
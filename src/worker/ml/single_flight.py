@@ -0,0 +1,42 @@
+from typing import Any, Dict, Hashable, List
+
+
+class SingleFlight:
+    """
+    Объединение одновременных задач по ключу.
+
+    Первая задача с ключом становится ведущей и идет на генерацию; задачи с
+    тем же ключом, пришедшие до release, присоединяются к ней ведомыми и
+    получают ее результат. Все методы вызываются из event loop воркера.
+    """
+
+    def __init__(self):
+        self._followers: Dict[Hashable, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._followers)
+
+    def join(self, key: Hashable, follower: Any) -> bool:
+        """True - присоединен к ведущей; False - ведущей нет, вызывающий становится ей."""
+        followers = self._followers.get(key)
+        if followers is None:
+            self._followers[key] = []
+            return False
+        followers.append(follower)
+        return True
+
+    def follow(self, key: Hashable, follower: Any) -> bool:
+        """Как join, но без ведущей ничего не меняет: вызывающий в ведущие не записывается."""
+        followers = self._followers.get(key)
+        if followers is None:
+            return False
+        followers.append(follower)
+        return True
+
+    def followers(self, key: Hashable) -> List[Any]:
+        """Текущие ведомые ключа (копия)."""
+        return list(self._followers.get(key, ()))
+
+    def release(self, key: Hashable) -> List[Any]:
+        """Завершает ключ: возвращает ведомых, следующая задача с ключом снова будет ведущей."""
+        return self._followers.pop(key, [])
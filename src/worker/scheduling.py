@@ -0,0 +1,120 @@
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+
+# Класс приоритета и поток (пользователь) сообщения
+ScheduleKey = Callable[[Any], Tuple[int, Hashable]]
+
+
+class _PriorityClass:
+    """Deficit round robin по потокам одного класса приоритета."""
+
+    def __init__(self, quantum: int):
+        self.quantum = quantum
+        self.size = 0
+        self.flows: Dict[Hashable, Deque[Tuple[Any, int]]] = {}
+        self.active: Deque[Hashable] = deque()
+        self.deficit: Dict[Hashable, int] = {}
+        # Получил ли поток в голове active свой квант на текущем ходу
+        self.granted = False
+
+    def push(self, flow: Hashable, item: Any, cost: int) -> None:
+        queue = self.flows.get(flow)
+        if queue is None:
+            queue = self.flows[flow] = deque()
+            self.active.append(flow)
+            self.deficit[flow] = 0
+        queue.append((item, cost))
+        self.size += 1
+
+    def pop(self) -> Any:
+        while True:
+            flow = self.active[0]
+            if not self.granted:
+                self.deficit[flow] += self.quantum
+                self.granted = True
+            queue = self.flows[flow]
+            item, cost = queue[0]
+            if cost <= self.deficit[flow]:
+                queue.popleft()
+                self.size -= 1
+                self.deficit[flow] -= cost
+                if not queue:
+                    # Опустевший поток уходит из круга вместе с остатком дефицита
+                    del self.flows[flow]
+                    del self.deficit[flow]
+                    self.active.popleft()
+                    self.granted = False
+                return item
+            # Кванта не хватает - ход переходит к следующему потоку
+            self.active.rotate(-1)
+            self.granted = False
+
+
+class FairScheduler:
+    """
+    Буфер задач перед инференсом с тем же интерфейсом, что у asyncio.Queue
+    (put/get/get_nowait), - подставляется в MicroBatcher вместо FIFO.
+
+    Между классами приоритета - строгий приоритет: задачи младшего класса
+    выдаются, только когда старшие пусты. Внутри класса - deficit round
+    robin по потокам (пользователям): каждый поток за ход получает quantum
+    и отдает задачи, пока хватает дефицита, поэтому пользователь с тысячами
+    задач в буфере получает ту же долю, что и пользователь с одной.
+
+    Справедливость действует в пределах буфера: брокер отдает воркеру не
+    больше prefetch неподтвержденных сообщений, остальные ждут в очереди
+    брокера в его порядке.
+    """
+
+    def __init__(self, key: ScheduleKey, quantum: int = 1, cost: Callable[[Any], int] = lambda item: 1):
+        if quantum < 1:
+            raise ValueError("quantum must be >= 1")
+        self._key = key
+        self._cost = cost
+        self._quantum = quantum
+        self._classes: Dict[int, _PriorityClass] = {}
+        self._order: list[int] = []
+        self._size = 0
+        self._nonempty = asyncio.Event()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def flows(self) -> Dict[int, int]:
+        """Число потоков с задачами в буфере по классам приоритета."""
+        return {priority: len(cls.flows) for priority, cls in self._classes.items() if cls.size}
+
+    def put_nowait(self, item: Any) -> None:
+        priority, flow = self._key(item)
+        cls = self._classes.get(priority)
+        if cls is None:
+            cls = self._classes[priority] = _PriorityClass(self._quantum)
+            self._order = sorted(self._classes, reverse=True)
+        cls.push(flow, item, max(self._cost(item), 1))
+        self._size += 1
+        self._nonempty.set()
+
+    async def put(self, item: Any) -> None:
+        self.put_nowait(item)
+
+    def get_nowait(self) -> Any:
+        if not self._size:
+            raise asyncio.QueueEmpty
+        for priority in self._order:
+            cls = self._classes[priority]
+            if cls.size:
+                self._size -= 1
+                return cls.pop()
+        raise RuntimeError("Scheduler size is out of sync with its classes")
+
+    async def get(self) -> Any:
+        # Ожидание отделено от выдачи: отмена get (wait_for в батчере) не теряет задачу
+        while not self._size:
+            self._nonempty.clear()
+            await self._nonempty.wait()
+        return self.get_nowait()